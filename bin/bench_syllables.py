@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""
+microbenchmark for syllable counting on cache misses: times the rule engine
+in syllables._compute_count against the original one-regex-at-a-time version.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import sys
+import timeit
+
+from poetryutils2 import syllables
+
+DEFAULT_WORDS = os.path.join(os.path.dirname(syllables.__file__), 'words.txt')
+
+
+def legacy_count(word):
+    """syllables._compute_count as it was: a vowel loop and a search per rule"""
+    if word[-1] == "e":
+        word = word[:-1]
+
+    count = 0
+    prev_was_vowel = 0
+    for c in word:
+        is_vowel = c in ("a", "e", "i", "o", "u", "y")
+        if is_vowel and not prev_was_vowel:
+            count += 1
+        prev_was_vowel = is_vowel
+
+    for r in syllables.fallback_addsyl:
+        if r.search(word):
+            count += 1
+    for r in syllables.fallback_subsyl:
+        if r.search(word):
+            count -= 1
+
+    if count == 0:
+        count = 1
+    return count
+
+
+def load_words(filepath):
+    with io.open(filepath, encoding='utf-8') as f:
+        words = [syllables._normalize_word(l.split()[0]) for l in f if l.strip()]
+    return [w for w in words if w.isalpha()]
+
+
+def main(args=sys.argv):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('words', type=str, nargs='?', default=DEFAULT_WORDS,
+                        help="file of words, one per line")
+    parser.add_argument('-r', '--repeat', type=int, default=20,
+                        help='passes over the word list')
+    args = parser.parse_args()
+
+    words = load_words(args.words)
+    mismatches = [w for w in words if legacy_count(w) != syllables._compute_count(w)]
+    if mismatches:
+        print('counts differ for: %s' % ', '.join(mismatches[:20]))
+        return 1
+
+    def run(func):
+        def timed():
+            for w in words:
+                func(w)
+        return min(timeit.repeat(timed, number=args.repeat, repeat=3))
+
+    legacy = run(legacy_count)
+    current = run(syllables._compute_count)
+    misses = len(words) * args.repeat
+    print('%d words, %d misses per run' % (len(words), misses))
+    print('legacy:  %0.2fus per miss' % (legacy / misses * 1e6))
+    print('current: %0.2fus per miss' % (current / misses * 1e6))
+    print('speedup: %0.2fx' % (legacy / current))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""
+microbenchmark for tokenizing lines for syllable counting: utils.tokenize
+against the old pipeline of syllables._format_input, split() and isalpha().
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import sys
+import json
+import timeit
+
+from poetryutils2 import syllables, utils
+
+
+def legacy_tokenize(text):
+    return [w for w in syllables._format_input(text).split() if w.isalpha()]
+
+
+def load_lines(filepaths, key=None):
+    lines = list()
+    for filepath in filepaths:
+        with io.open(filepath, encoding='utf-8') as f:
+            for line in f:
+                if key:
+                    try:
+                        line = json.loads(line).get(key)
+                    except ValueError:
+                        continue
+                    if line:
+                        lines.append(line)
+                else:
+                    lines.append(line.strip())
+    return lines
+
+
+def main(args=sys.argv):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('src', type=str, nargs='+', help="corpus files, one entry per line")
+    parser.add_argument('-k', '--key', type=str,
+                        help='read lines as json, taking the text from this key')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='passes over the corpus')
+    args = parser.parse_args()
+
+    lines = load_lines(args.src, args.key)
+    mismatches = [l for l in lines if legacy_tokenize(l) != utils.tokenize(l)]
+    if mismatches:
+        print('words differ for %d lines, e.g. %r' % (len(mismatches), mismatches[0]))
+        return 1
+
+    def run(func):
+        def timed():
+            for l in lines:
+                func(l)
+        return min(timeit.repeat(timed, number=args.repeat, repeat=3))
+
+    legacy = run(legacy_tokenize)
+    current = run(utils.tokenize)
+    count = len(lines) * args.repeat
+    print('%d lines, identical words for all of them' % len(lines))
+    print('legacy:  %0.2fus per line' % (legacy / count * 1e6))
+    print('current: %0.2fus per line' % (current / count * 1e6))
+    print('speedup: %0.2fx' % (legacy / current))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+"""
+exports a phoneme db to a read-only snapshot file,
+which PhonemeRhymer can load with snapshot_path.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+import time
+
+from poetryutils2 import rhyme
+
+
+def main(args=sys.argv):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('lang', type=str, help="language of the phoneme db (en, fr)")
+    parser.add_argument('-d', '--db', type=str, help='path to the phoneme db')
+    parser.add_argument('-o', '--out', type=str, help='path for the snapshot file')
+    args = parser.parse_args()
+
+    rhymer = rhyme.PhonemeRhymer(rhyme.PHONEME_DATA_DIR, args.lang, dbpath=args.db)
+    start = time.time()
+    count = rhymer.export_snapshot(args.out)
+    print('exported %d entries in %0.2fs' % (count, time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+"""
+upgrades a phoneme db to the current record format, once.
+after this, lookups against the db skip all legacy handling.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+import time
+
+from poetryutils2 import rhyme
+
+
+def main(args=sys.argv):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('lang', type=str, help="language of the phoneme db (en, fr)")
+    parser.add_argument('-d', '--db', type=str, help='path to the phoneme db')
+    parser.add_argument('-i', '--rebuild-index', action='store_true',
+                        help='also rebuild the rhyme index')
+    args = parser.parse_args()
+
+    rhymer = rhyme.PhonemeRhymer(rhyme.PHONEME_DATA_DIR, args.lang, dbpath=args.db)
+    start = time.time()
+    with rhymer:
+        count = rhymer.upgrade_db()
+        print('upgraded %d of %d entries to version %d in %0.2fs' % (
+            count, len(rhymer), rhyme.RECORD_VERSION, time.time() - start))
+        if args.rebuild_index:
+            rhymer.rebuild_rhyme_index()
+            print('rebuilt rhyme index in %0.2fs' % (time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+warms up a phoneme db from one or more corpus files, before it sees live
+traffic: the most common rhyme words in the corpus are phonemized and stored.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import sys
+import json
+import time
+
+from poetryutils2 import rhyme, utils
+
+
+def iter_texts(filepaths, key=None):
+    """yields lines from each file; if key is set, lines are json and we yield line[key]"""
+    for filepath in filepaths:
+        with io.open(filepath, encoding='utf-8') as f:
+            for line in f:
+                if key:
+                    try:
+                        text = json.loads(line).get(key)
+                    except ValueError:
+                        continue
+                    if text:
+                        yield text
+                else:
+                    yield line.strip()
+
+
+def main(args=sys.argv):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('src', type=str, nargs='+', help="corpus files, one entry per line")
+    parser.add_argument('-l', '--lang', type=str, default='en',
+                        help="language of the phoneme db (en, fr)")
+    parser.add_argument('-d', '--db', type=str, help='path to the phoneme db')
+    parser.add_argument('-k', '--key', type=str,
+                        help='read lines as json, taking the text from this key')
+    parser.add_argument('-n', '--top', type=int, default=100000,
+                        help='number of words to phonemize')
+    parser.add_argument('-c', '--capacity', type=int,
+                        help='distinct words to keep counts for (default 10 * top)')
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='espeak worker processes')
+    args = parser.parse_args()
+
+    rhymer = rhyme.PhonemeRhymer(rhyme.PHONEME_DATA_DIR, args.lang, dbpath=args.db)
+    counter = utils.BoundedCounter(args.capacity or args.top * 10)
+    start = time.time()
+    line_count = 0
+    for text in iter_texts(args.src, args.key):
+        line_count += 1
+        word = rhymer.rhyme_word(text)
+        if word:
+            counter.add(word)
+    read_time = time.time() - start
+    print('read %d lines in %0.2fs (%0.1f lines/s): %d rhyme words, ~%d distinct' % (
+        line_count, read_time, line_count / read_time if read_time else 0,
+        counter.total, len(counter)))
+
+    top = counter.most_common(args.top)
+    covered = sum(count for _, count in top)
+    print('the top %d words cover ~%0.1f%% of rhyme words' % (
+        len(top), 100.0 * covered / counter.total if counter.total else 0))
+
+    import_start = time.time()
+    unresolved = rhymer.unresolved_added
+    added = rhymer.add_new_words([w for w, _ in top], workers=args.workers)
+    unresolved = rhymer.unresolved_added - unresolved
+    import_time = time.time() - import_start
+
+    with rhymer._open_db() as db:
+        stored = [(w, count) for w, count in top if w.encode('utf-8') in db]
+    stored_count = sum(count for _, count in stored)
+    print('added %d words in %0.2fs (%0.1f words/s), %d more had no usable phonemes' % (
+        added, import_time, (added + unresolved) / import_time if import_time else 0,
+        unresolved))
+    print('%d of the top %d words have phonemes, covering %0.1f%% of rhyme words' % (
+        len(stored), len(top), 100.0 * stored_count / counter.total if counter.total else 0))
+    print('db has %d entries, finished in %0.2fs' % (len(rhymer), time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
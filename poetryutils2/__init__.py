@@ -1,6 +1,6 @@
 
-from .syllables import count_syllables
-from .utils import line_iter, filter_line
+from .syllables import count_syllables, count_syllables_many
+from .utils import line_iter, filter_line, filter_lines
 from .sorting import Coupler, Rhymer, Haikuer, Limericker, Concrete
 from . import filters
 
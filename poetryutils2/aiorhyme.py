@@ -0,0 +1,180 @@
+# coding: utf-8
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+import time
+import asyncio
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from . import espeak_wrapper, rhyme
+
+"""
+asyncio support for rhyme lookups. python 3 only, so this module
+is not imported by the package by default.
+"""
+
+
+async def run_espeak_async(args, timeout=espeak_wrapper.DEFAULT_TIMEOUT):
+    """
+    like espeak_wrapper.run_espeak, without blocking the event loop.
+    espeak is killed if it times out, or if the caller is cancelled.
+    """
+    loop = asyncio.get_event_loop()
+    # the first call looks for espeak by running it
+    command = await loop.run_in_executor(None, espeak_wrapper._get_espeak_command)
+    start = time.time()
+    proc = await asyncio.create_subprocess_exec(
+        command, *args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        await _kill(proc)
+        espeak_wrapper.stats.record(time.time() - start, failed=True, timed_out=True)
+        raise espeak_wrapper.EspeakError('espeak timed out after %ds' % timeout)
+    except BaseException:
+        await _kill(proc)
+        raise
+    if proc.returncode != 0:
+        espeak_wrapper.stats.record(time.time() - start, failed=True)
+        raise espeak_wrapper.EspeakError('espeak exited with status %d: %s' % (
+            proc.returncode, err.decode('utf-8', 'replace').strip()))
+    espeak_wrapper.stats.record(time.time() - start)
+    return out.decode('utf-8')
+
+
+async def _kill(proc):
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+
+async def extract_phonemes_async(word, lang='en', timeout=espeak_wrapper.DEFAULT_TIMEOUT,
+                                 retries=2, backoff=0.1):
+    """
+    like espeak_wrapper.extract_phonemes, without blocking the event loop.
+    returns just the phonemes, which are empty if every attempt fails.
+    """
+    args = ['-v', espeak_wrapper.ESPEAK_LANG_TABLE[lang], '-q', '--ipa', word]
+    for attempt in range(retries + 1):
+        try:
+            return (await run_espeak_async(args, timeout)).strip()
+        except espeak_wrapper.EspeakError as err:
+            if attempt == retries:
+                print('espeak failed for %s (%s), giving up' % (word, err), file=sys.stderr)
+                return ''
+            espeak_wrapper.stats.record_retry()
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+
+class AsyncPhonemeRhymer(object):
+
+    """
+    an asyncio front end for a PhonemeRhymer.
+
+    espeak runs as an asyncio subprocess, and db access happens on a single
+    worker thread, since dbm handles aren't thread safe. concurrent requests
+    for the same missing word share a single espeak call.
+
+    the wrapped rhymer shouldn't be used synchronously at the same time.
+    """
+
+    def __init__(self, rhymer, timeout=30):
+        super(AsyncPhonemeRhymer, self).__init__()
+        if not isinstance(rhymer, rhyme.PhonemeRhymer):
+            rhymer = rhyme.rhymer_for_language(rhymer)
+        self.rhymer = rhymer
+        self.timeout = timeout
+        self.coalesced = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._inflight = dict()
+        self._warmed = None
+
+    async def aget_phonemes(self, word):
+        entry = await self.aget_entry(word)
+        return entry.phonemes
+
+    async def aget_entry(self, word):
+        await self._warm()
+        word = self.rhymer._normalize_word(word)
+        entry = self.rhymer.cache.get(word)
+        if entry is not None:
+            return entry
+
+        future = self._inflight.get(word)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(self._resolve(word))
+            self._inflight[word] = future
+            future.add_done_callback(lambda f: self._inflight.pop(word, None))
+        # shielded, so one cancelled caller doesn't cancel the others
+        return await asyncio.shield(future)
+
+    async def ais_rhyme(self, text1, text2):
+        await self._warm()
+        w1 = self.rhymer.rhyme_word(text1)
+        w2 = self.rhymer.rhyme_word(text2)
+        e1, e2 = await asyncio.gather(self.aget_entry(w1), self.aget_entry(w2))
+        return rhyme.is_rhyme_signatures(
+            self.rhymer._make_signature(w1, e1), self.rhymer._make_signature(w2, e2),
+            self.rhymer.rhyme_depth)
+
+    async def aprefetch(self, words):
+        await self._warm()
+        words = set(self.rhymer._normalize_word(w) for w in words if w)
+        await asyncio.gather(*[self.aget_entry(w) for w in words])
+
+    async def aclose(self):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self._executor, self.rhymer.flush)
+        self._executor.shutdown(wait=True)
+
+    async def _warm(self):
+        """
+        runs the rhymer's one time setup on the worker thread: finding
+        espeak, and loading (or building) the doubled endings table that
+        normalization uses. after that, normalizing is just cache lookups.
+        """
+        if self._warmed is None:
+            loop = asyncio.get_event_loop()
+            self._warmed = loop.run_in_executor(self._executor, self._warm_up)
+        # shared by every caller, so one being cancelled doesn't cancel it
+        await asyncio.shield(self._warmed)
+
+    def _warm_up(self):
+        espeak_wrapper._get_espeak_command()
+        if self.rhymer.lang == 'en':
+            self.rhymer.doubled_endings
+
+    async def _resolve(self, word):
+        loop = asyncio.get_event_loop()
+        entry = await loop.run_in_executor(self._executor, self._read, word)
+        if entry is None:
+            phonemes = self.rhymer.lexicon.get(word)
+            if phonemes is None:
+                phonemes = await extract_phonemes_async(word, self.rhymer.lang, self.timeout)
+            else:
+                self.rhymer.lexicon_hits += 1
+            entry = self.rhymer._make_entry(phonemes)
+            await loop.run_in_executor(self._executor, self._write, word, entry)
+        self.rhymer.cache.put(word, entry)
+        return entry
+
+    def _read(self, word):
+        entry = self.rhymer._snapshot_entry(word)
+        if entry is not None:
+            return entry
+        with self.rhymer._open_db():
+            entry = self.rhymer._read_entry(word)
+        if entry is None:
+            entry = self.rhymer._lookup_unresolved([word]).get(word)
+        return entry
+
+    def _write(self, word, entry):
+        with self.rhymer._open_db():
+            self.rhymer._record_entries({word: entry})
@@ -2,13 +2,80 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+import sys
+import time
+import threading
 import subprocess
+from multiprocessing.pool import ThreadPool
 
 ESPEAK_LANG_TABLE = {
     'en': 'en-us',
     'fr': 'fr'
     }
 
+# lines shorter than this are treated by espeak as the end of a clause,
+# so feeding one word per line gets us one line of ipa per word.
+BATCH_LINE_LENGTH = 1000
+
+DEFAULT_TIMEOUT = 30
+
+
+class EspeakError(Exception):
+    pass
+
+
+class EspeakStats(object):
+
+    """counts of espeak runs and their cost, shared by all threads"""
+
+    def __init__(self):
+        super(EspeakStats, self).__init__()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.total_time = 0.0
+
+    def record(self, elapsed, failed=False, timed_out=False):
+        with self._lock:
+            self.calls += 1
+            self.total_time += elapsed
+            if failed:
+                self.failures += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'failures': self.failures,
+                'timeouts': self.timeouts,
+                'retries': self.retries,
+                'total_time': self.total_time,
+                'mean_latency': self.total_time / self.calls if self.calls else 0.0
+            }
+
+
+stats = EspeakStats()
+
+
+def _command_works(cmd):
+    with open(os.devnull, 'wb') as devnull:
+        try:
+            return subprocess.call([cmd, '--version'], stdout=devnull, stderr=devnull) == 0
+        except OSError:
+            return False
+
 
 def _get_espeak_command():
     '''extracting phonemes relies on espeak (http://espeak.sourceforge.net)
@@ -16,9 +83,9 @@ def _get_espeak_command():
     '''
     if not hasattr(_get_espeak_command, 'ESPEAK_COMMAND_NAME'):
         cmd = None
-        if subprocess.call(["espeak", "--version"]) == 0:
+        if _command_works('espeak'):
             cmd = 'espeak'
-        elif subprocess.call(["speak", "--version"]) == 0:
+        elif _command_works('speak'):
             cmd = "speak"
         else:
             raise ImportError(
@@ -28,11 +95,162 @@ def _get_espeak_command():
     return getattr(_get_espeak_command, 'ESPEAK_COMMAND_NAME')
 
 
-def extract_phonemes(word, lang='en'):
-        cmd = [
-            _get_espeak_command(), '-v',
-            ESPEAK_LANG_TABLE[lang],
-            '-q', '--ipa', word]
-        output = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-        phonemes = output.stdout.read().decode('utf-8').strip()
-        return word, phonemes
+def run_espeak(args, text=None, timeout=DEFAULT_TIMEOUT):
+    """
+    runs espeak once with args, feeding it text on stdin if given,
+    and returns its decoded output. the process is always waited on,
+    and killed if it runs past timeout. raises EspeakError on failure.
+    """
+    cmd = [_get_espeak_command()] + args
+    start = time.time()
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE if text is not None else None,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        out, err, timed_out = _communicate(
+            proc, text.encode('utf-8') if text is not None else None, timeout)
+    except Exception:
+        proc.kill()
+        proc.wait()
+        raise
+    if timed_out:
+        stats.record(time.time() - start, failed=True, timed_out=True)
+        raise EspeakError('espeak timed out after %ds' % timeout)
+
+    if proc.returncode != 0:
+        stats.record(time.time() - start, failed=True)
+        raise EspeakError('espeak exited with status %d: %s' % (
+            proc.returncode, err.decode('utf-8', 'replace').strip()))
+    stats.record(time.time() - start)
+    return out.decode('utf-8')
+
+
+def _communicate(proc, data, timeout):
+    """
+    proc.communicate, killing proc if it runs past timeout.
+    returns (stdout, stderr, timed_out).
+    """
+    if sys.version_info > (3, 3):
+        try:
+            out, err = proc.communicate(data, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            out, err = proc.communicate()
+            return out, err, True
+        return out, err, False
+
+    # python 2's communicate has no timeout, so a timer kills proc instead
+    expired = threading.Event()
+
+    def kill():
+        if proc.poll() is None:
+            expired.set()
+            proc.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        out, err = proc.communicate(data)
+    finally:
+        timer.cancel()
+    return out, err, expired.is_set()
+
+
+def extract_phonemes(word, lang='en', timeout=DEFAULT_TIMEOUT, retries=2, backoff=0.1):
+    """
+    returns (word, phonemes). failed runs are retried, waiting backoff seconds
+    and then twice as long each time; if every attempt fails the phonemes are
+    empty, the same as when espeak has nothing to say about a word.
+    """
+    args = ['-v', ESPEAK_LANG_TABLE[lang], '-q', '--ipa', word]
+    for attempt in range(retries + 1):
+        try:
+            return word, run_espeak(args, timeout=timeout).strip()
+        except EspeakError as err:
+            if attempt == retries:
+                print('espeak failed for %s (%s), giving up' % (word, err), file=sys.stderr)
+                return word, ''
+            stats.record_retry()
+            time.sleep(backoff * 2 ** attempt)
+
+
+def extract_phonemes_batch(words, lang='en', timeout=DEFAULT_TIMEOUT):
+    """
+    phonemizes a list of words with a single espeak process.
+    returns a list of (word, phonemes) tuples, in input order.
+    raises EspeakError if espeak fails, times out, or if its output
+    can't be matched up with the input.
+    """
+    args = ['-v', ESPEAK_LANG_TABLE[lang], '-q', '--ipa', '-l', str(BATCH_LINE_LENGTH)]
+    out = run_espeak(args, '\n'.join(words) + '\n', timeout)
+    lines = out.splitlines()
+    if len(lines) != len(words):
+        raise EspeakError('expected %d lines of output, got %d' % (len(words), len(lines)))
+    return [(w, l.strip()) for w, l in zip(words, lines)]
+
+
+def _batchable(word):
+    """words that espeak will treat as a single clause on their own line"""
+    return word.isalpha()
+
+
+class EspeakPool(object):
+
+    """
+    phonemizes words in bulk: words are split into batches, each batch
+    is handled by one espeak process, and batches run concurrently.
+    a batch that fails (crash, timeout, garbled output) is retried
+    one word at a time.
+    """
+
+    def __init__(self, lang='en', workers=4, batch_size=200, timeout=DEFAULT_TIMEOUT):
+        super(EspeakPool, self).__init__()
+        self.lang = lang
+        self.workers = workers
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.failed_batches = 0
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def extract(self, words):
+        """returns a dict of word -> phonemes for words"""
+        words = list(set(words))
+        results = dict()
+        batchable = [w for w in words if _batchable(w)]
+        for w in words:
+            if not _batchable(w):
+                results[w] = extract_phonemes(w, self.lang, self.timeout)[1] if w.strip() else ''
+
+        batches = [batchable[i:i + self.batch_size]
+                   for i in range(0, len(batchable), self.batch_size)]
+        if len(batches) == 1:
+            batch_results = [self._run_batch(batches[0])]
+        elif batches:
+            if self._pool is None:
+                self._pool = ThreadPool(self.workers)
+            batch_results = self._pool.map(self._run_batch, batches)
+        else:
+            batch_results = []
+
+        for batch in batch_results:
+            results.update(batch)
+        return results
+
+    def _run_batch(self, words):
+        try:
+            return extract_phonemes_batch(words, self.lang, self.timeout)
+        except EspeakError as err:
+            self.failed_batches += 1
+            print('espeak batch failed (%s), retrying word by word' % err, file=sys.stderr)
+            return [extract_phonemes(w, self.lang, self.timeout) for w in words]
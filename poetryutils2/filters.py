@@ -171,6 +171,11 @@ def syllable_count_check(text, syllable_counts, max_syllables):
     return True
 
 
+def syllable_count_batch(texts, syllable_counts):
+    """syllable_count_check for a batch of lines, see syllables.count_syllables_many"""
+    return [count not in syllable_counts for count in syllables.count_syllables_many(texts)]
+
+
 def syllable_count_filter(syllable_counts):
     counts = utils.parse_range_string(syllable_counts)
     if not len(counts):
@@ -179,6 +184,8 @@ def syllable_count_filter(syllable_counts):
     kwargs = {'syllable_counts': counts, 'max_syllables': max(counts)}
     f = functools.partial(syllable_count_check, **kwargs)
     f.__doc__ = "filtering syllable counts to %s" % repr(counts)
+    # used by utils.filter_lines, when lines are filtered in chunks
+    f.batch = functools.partial(syllable_count_batch, syllable_counts=counts)
     return f
 
 
@@ -216,10 +223,7 @@ def real_word_ratio(sentence, debug=False, cutoff=None, lang='en'):
     becomes pass/fail if cutoff is not None
     """
 
-    sentence = utils.fix_hashtags(sentence)
-
-    sentence = re.sub(r'[#,\.\?\!]', ' ', sentence)
-    sentence_words = [w.lower() for w in sentence.split()]
+    sentence_words = [w.lower() for w in utils.split_words(sentence)]
     if not len(sentence_words):
         return 0
 
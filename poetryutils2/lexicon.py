@@ -0,0 +1,121 @@
+# coding: utf-8
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import re
+import sys
+
+"""
+loading of static pronunciation lexicons, in the CMUdict format:
+
+    WORD  PH1 PH2 PH3
+    WORD(2)  PH1 PH2
+
+phones are ARPAbet, with vowels carrying a stress digit. they are converted
+to ipa the way espeak writes it for en-us, so that entries from the lexicon
+rhyme with entries from espeak.
+"""
+
+ARPABET_VOWELS = {
+    'AA': 'ɑː',
+    'AE': 'æ',
+    'AH': 'ʌ',
+    'AO': 'ɔː',
+    'AW': 'aʊ',
+    'AY': 'aɪ',
+    'EH': 'ɛ',
+    'ER': 'ɜː',
+    'EY': 'eɪ',
+    'IH': 'ɪ',
+    'IY': 'iː',
+    'OW': 'oʊ',
+    'OY': 'ɔɪ',
+    'UH': 'ʊ',
+    'UW': 'uː',
+}
+
+# unstressed vowels espeak reduces
+ARPABET_UNSTRESSED = {
+    'AH': 'ə',
+    'ER': 'ɚ',
+}
+
+ARPABET_CONSONANTS = {
+    'B': 'b',
+    'CH': 'tʃ',
+    'D': 'd',
+    'DH': 'ð',
+    'F': 'f',
+    'G': 'ɡ',
+    'HH': 'h',
+    'JH': 'dʒ',
+    'K': 'k',
+    'L': 'l',
+    'M': 'm',
+    'N': 'n',
+    'NG': 'ŋ',
+    'P': 'p',
+    'R': 'ɹ',
+    'S': 's',
+    'SH': 'ʃ',
+    'T': 't',
+    'TH': 'θ',
+    'V': 'v',
+    'W': 'w',
+    'Y': 'j',
+    'Z': 'z',
+    'ZH': 'ʒ',
+}
+
+STRESS_MARKS = {'1': 'ˈ', '2': 'ˌ'}
+
+VARIANT_RE = re.compile(r'\(\d+\)$')
+
+
+def arpabet_to_ipa(phones):
+    """converts a list of ARPAbet phones to an espeak style ipa string"""
+    out = list()
+    last = len(phones) - 1
+    for idx, phone in enumerate(phones):
+        base = phone.rstrip('012')
+        stress = phone[len(base):]
+        if base in ARPABET_VOWELS:
+            if stress in STRESS_MARKS:
+                out.append(STRESS_MARKS[stress] + ARPABET_VOWELS[base])
+            elif base in ARPABET_UNSTRESSED:
+                out.append(ARPABET_UNSTRESSED[base])
+            elif base == 'IY' and idx == last:
+                # word final unstressed 'y', as in 'happy'
+                out.append('i')
+            else:
+                out.append(ARPABET_VOWELS[base])
+        elif base in ARPABET_CONSONANTS:
+            out.append(ARPABET_CONSONANTS[base])
+        else:
+            raise ValueError('unknown ARPAbet phone %s' % phone)
+    return ''.join(out)
+
+
+def load_lexicon(path):
+    """
+    loads a CMUdict style lexicon file, returning a dict of
+    lowercased word -> ipa. only the first variant of a word is kept.
+    """
+    lexicon = dict()
+    skipped = 0
+    with io.open(path, encoding='latin-1') as f:
+        for line in f:
+            if not line.strip() or line.startswith(';;;'):
+                continue
+            toks = line.split()
+            word = toks[0].lower()
+            if VARIANT_RE.search(word) or word in lexicon:
+                continue
+            try:
+                lexicon[word] = arpabet_to_ipa(toks[1:])
+            except ValueError:
+                skipped += 1
+
+    print('loaded %d lexicon entries (%d skipped)' % (len(lexicon), skipped), file=sys.stderr)
+    return lexicon
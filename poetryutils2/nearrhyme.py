@@ -0,0 +1,205 @@
+# coding: utf-8
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+
+from . import rhyme
+
+"""
+near (slant) rhymes: end sounds are encoded as vectors of phonetic features,
+so that 'time' and 'mine', or 'nothing' and 'running', come out close together.
+requires numpy, so this module is not imported by the package by default.
+"""
+
+# feature columns, all in [0, 1]
+PRESENT, VOWEL, VOICED, PLACE, MANNER, HEIGHT, BACKNESS, ROUNDED, LONG, NASAL, RHOTIC = range(11)
+FEATURE_COUNT = 11
+
+# how much a difference in each feature counts
+WEIGHTS = np.array([2.0, 2.0, 1.0, 1.0, 1.0, 1.0, 1.0, 0.5, 0.25, 0.5, 0.5])
+SLOT_MAX = np.sqrt(WEIGHTS.sum())
+
+# end sounds are right aligned in this many slots; anything earlier is ignored
+SLOTS = 6
+
+# vowels: height (0 is open), backness (0 is front), rounded
+_VOWELS = {
+    'i': (1.0, 0.0, 0), 'y': (1.0, 0.0, 1), 'ɨ': (1.0, 0.5, 0), 'u': (1.0, 1.0, 1),
+    'ɪ': (0.85, 0.15, 0), 'ɩ': (0.85, 0.15, 0), 'ʊ': (0.85, 0.85, 1), 'ɷ': (0.85, 0.85, 1),
+    'e': (0.7, 0.0, 0), 'ø': (0.7, 0.0, 1), 'o': (0.7, 1.0, 1),
+    'ö': (0.55, 1.0, 1), 'ə': (0.5, 0.5, 0), 'ɚ': (0.5, 0.5, 0), 'ɜ': (0.45, 0.5, 0),
+    'ɛ': (0.45, 0.0, 0), 'œ': (0.45, 0.0, 1), 'ʌ': (0.45, 0.8, 0), 'ɔ': (0.45, 1.0, 1),
+    'ɐ': (0.3, 0.5, 0), 'æ': (0.15, 0.05, 0),
+    'a': (0.0, 0.2, 0), 'ɑ': (0.0, 1.0, 0), 'ɒ': (0.0, 1.0, 1),
+}
+
+# consonants: voiced, place (0 is bilabial, 1 is glottal), manner (0 is a stop)
+_CONSONANTS = {
+    'p': (0, 0.0, 0.0), 'b': (1, 0.0, 0.0), 't': (0, 0.45, 0.0), 'd': (1, 0.45, 0.0),
+    'k': (0, 0.85, 0.0), 'ɡ': (1, 0.85, 0.0), 'g': (1, 0.85, 0.0), 'ʔ': (0, 1.0, 0.0),
+    'f': (0, 0.15, 0.4), 'v': (1, 0.15, 0.4), 'θ': (0, 0.3, 0.4), 'ð': (1, 0.3, 0.4),
+    's': (0, 0.45, 0.4), 'z': (1, 0.45, 0.4), 'ʃ': (0, 0.55, 0.4), 'ʒ': (1, 0.55, 0.4),
+    'ç': (0, 0.7, 0.4), 'x': (0, 0.85, 0.4), 'h': (0, 1.0, 0.4),
+    'm': (1, 0.0, 0.6), 'n': (1, 0.45, 0.6), 'ɲ': (1, 0.7, 0.6), 'ŋ': (1, 0.85, 0.6),
+    'l': (1, 0.45, 0.8), 'ɫ': (1, 0.45, 0.8),
+    'ɾ': (1, 0.45, 0.9), 'r': (1, 0.45, 0.9), 'ɹ': (1, 0.45, 1.0), 'ʁ': (1, 0.92, 0.9),
+    'w': (1, 0.0, 1.0), 'ʍ': (0, 0.0, 1.0), 'ɥ': (1, 0.0, 1.0), 'j': (1, 0.7, 1.0),
+}
+
+LENGTH_MARK = 'ː'
+NASAL_MARK = '̃'
+
+
+def _feature_table():
+    table = dict()
+    for symbol, (height, backness, rounded) in _VOWELS.items():
+        features = np.zeros(FEATURE_COUNT)
+        features[[PRESENT, VOWEL, VOICED]] = 1
+        features[HEIGHT], features[BACKNESS], features[ROUNDED] = height, backness, rounded
+        features[RHOTIC] = symbol in 'ɚɜ'
+        table[symbol] = features
+    for symbol, (voiced, place, manner) in _CONSONANTS.items():
+        features = np.zeros(FEATURE_COUNT)
+        features[PRESENT] = 1
+        features[VOICED], features[PLACE], features[MANNER] = voiced, place, manner
+        features[NASAL] = manner == 0.6
+        features[RHOTIC] = symbol in 'ɹrɾʁ'
+        table[symbol] = features
+    return table
+
+
+PHONEME_FEATURES = _feature_table()
+
+
+def encode_sound(sound):
+    """
+    returns (vector, length) for an ipa end sound: a SLOTS x FEATURE_COUNT array
+    of the features of its last SLOTS phonemes, right aligned, and the number
+    of phonemes encoded. stress marks and unknown symbols are skipped.
+    """
+    phones = list()
+    for char in sound:
+        if char in PHONEME_FEATURES:
+            phones.append(PHONEME_FEATURES[char].copy())
+        elif phones and char == LENGTH_MARK:
+            phones[-1][LONG] = 1
+        elif phones and char == NASAL_MARK:
+            phones[-1][NASAL] = 1
+    phones = phones[-SLOTS:]
+    vector = np.zeros((SLOTS, FEATURE_COUNT))
+    if phones:
+        vector[SLOTS - len(phones):] = phones
+    return vector, len(phones)
+
+
+class EndSoundSpace(object):
+
+    """
+    a growing set of end sounds, with their vectors stacked in one array
+    so that distances to all of them are computed in a single pass.
+    distances are in [0, 1]: the mean, over phoneme slots, of the weighted
+    feature distance, with missing phonemes counting as different.
+    """
+
+    def __init__(self, capacity=256):
+        super(EndSoundSpace, self).__init__()
+        self.sounds = list()
+        self._positions = dict()
+        self._vectors = np.zeros((capacity, SLOTS, FEATURE_COUNT))
+        self._lengths = np.zeros(capacity, dtype=int)
+
+    def __len__(self):
+        return len(self.sounds)
+
+    def __contains__(self, sound):
+        return sound in self._positions
+
+    def add(self, sound):
+        """adds sound if it's new, returning its position"""
+        if sound in self._positions:
+            return self._positions[sound]
+        position = len(self.sounds)
+        if position == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+            self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+        self._vectors[position], self._lengths[position] = encode_sound(sound)
+        self.sounds.append(sound)
+        self._positions[sound] = position
+        return position
+
+    def distances(self, sound):
+        """returns an array of the distance from sound to each sound in the space"""
+        vector, length = encode_sound(sound)
+        count = len(self.sounds)
+        diff = self._vectors[:count] - vector
+        slot_distances = np.sqrt((diff * diff * WEIGHTS).sum(axis=2)) / SLOT_MAX
+        lengths = np.maximum(np.maximum(self._lengths[:count], length), 1)
+        return slot_distances.sum(axis=1) / lengths
+
+    def nearest(self, sound, threshold):
+        """returns (sound, distance) for the closest sound within threshold, or None"""
+        if not self.sounds:
+            return None
+        distances = self.distances(sound)
+        idx = int(np.argmin(distances))
+        if distances[idx] <= threshold:
+            return self.sounds[idx], float(distances[idx])
+        return None
+
+
+class NearRhymeIndex(object):
+
+    """
+    near rhyme lookups over every word in a PhonemeRhymer's rhyme index.
+    the index is read once, when this is created; after that, the rhymer
+    adds words to it as they are indexed.
+    """
+
+    def __init__(self, rhymer, threshold=0.12):
+        super(NearRhymeIndex, self).__init__()
+        self.rhymer = rhymer
+        self.threshold = threshold
+        self.space = EndSoundSpace()
+        self.words = dict()
+        rhymer._flush_index()
+        with rhymer._open_index() as index:
+            for key in index.keys():
+                sound = key.decode('utf-8')
+                self.words[sound] = index[key].decode('utf-8').split('\n')
+                self.space.add(sound)
+
+    def add(self, sound, words):
+        """adds words newly indexed under sound"""
+        self.words.setdefault(sound, []).extend(words)
+        self.space.add(sound)
+
+    def near_rhymes(self, word, k=10, threshold=None):
+        """
+        returns up to k known words whose end sounds are within threshold
+        of word's, nearest first. exact rhymes are included; homophones aren't.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        sig = self.rhymer.signature(word)
+        if len(sig.phonemes) <= 1 or not sig.end_sound:
+            return []
+        self.rhymer._flush_index()
+        if not len(self.space):
+            return []
+        distances = self.space.distances(sig.end_sound)
+        candidates = np.flatnonzero(distances <= threshold)
+        candidates = candidates[np.argsort(distances[candidates], kind='stable')]
+
+        results = list()
+        # as in rhymes_for_word, the db is held open for all the candidates
+        with self.rhymer._open_db():
+            for idx in candidates:
+                for other in self.words[self.space.sounds[idx]]:
+                    if other == sig.word:
+                        continue
+                    if rhyme.signatures_homophonic(sig, self.rhymer.signature(other)):
+                        continue
+                    results.append(other)
+                    if len(results) >= k:
+                        return results
+        return results
@@ -9,31 +9,57 @@ import sys
 import functools
 import multiprocessing
 import time
+import contextlib
+from collections import namedtuple, defaultdict
 
-try:
-    if (sys.version_info > (3, 0)):
-        import dbm.gnu as dbm
-        DBM_V = 'dbm.gnu'
-    else:
-        import gdbm as dbm
-        DBM_V = 'gdbm'
-    DBM_FLAGS = 'cs'
-except ImportError:
-    import anydbm as dbm
-    DBM_V = 'anydbm'
-    DBM_FLAGS = 'c'
-
-from . import utils, espeak_wrapper, filters
-
-print('using %s for dbm' % DBM_V, file=sys.stderr)
+from . import utils, espeak_wrapper, filters, snapshot, stores, lexicon
 
 
 DOUBLE_END_LETTERS_EN = set('felios')
+# words are never empty, so this key of the doubled endings table is free
+# for the stamp of the wordlist it was built from
+DOUBLED_ENDINGS_STAMP_KEY = b''
 ipa_vowels = set("ˈˌaeiouyɑɛɪöɩɔɚɷʊʌœöøəæː")
+stress_marks = set('ˈˌ')
+
+# for counting syllables: vowels (a few more than ipa_vowels, which is tuned
+# for end sounds), the diphthongs that make a single nucleus, marks that
+# don't break up a nucleus, and the mark for a syllabic consonant ('n̩').
+syllable_vowels = set("aeiouyɑɛɪöɩɔɚɷʊʌœøəæɜɐɒɘɵɤɯɨᵻ")
+diphthongs = set(['aɪ', 'aʊ', 'eɪ', 'oʊ', 'ɔɪ', 'əʊ', 'eə', 'ɪə', 'ʊə'])
+length_marks = set('ː\u0303')
+SYLLABIC_MARK = '\u0329'
+
+# rhyme keys are precomputed for depths 1 through MAX_RHYME_DEPTH
+MAX_RHYME_DEPTH = 3
 
 
 PHONEME_DATA_DIR = os.path.join(utils.RESOURCES_DIR, 'phoneme_data')
 
+# db values are versioned records: RECORD_MARK, the record version, and then
+# tab separated fields. values without the mark are legacy entries that hold
+# only (possibly unadjusted) phonemes. every field after the phonemes is
+# derived from them, so a record with an old version is simply rebuilt.
+RECORD_MARK = '\x1e'
+RECORD_VERSION = 3
+# separates the rhyme keys within their field
+KEY_SEP = '\x1f'
+
+# the db records the version of its contents under this key. once a db is
+# stamped with the current version, lookups can skip all legacy handling.
+SCHEMA_KEY = (RECORD_MARK + 'schema').encode('utf-8')
+
+# rhyme_keys holds the word's rhyme key for each depth, starting at 1:
+# the key for depth 1 is the end sound, and the key for depth n runs from
+# the nth last vowel nucleus ('nation' and 'station' rhyme at depth 2).
+# syllables is the number of vowel nuclei, or 0 if there are no phonemes.
+PhonemeEntry = namedtuple('PhonemeEntry', ['phonemes', 'end_sound', 'rhyme_keys', 'syllables'])
+
+# everything is_rhyme needs to know about a word, so that comparing
+# two words is just a few string compares.
+RhymeSignature = namedtuple(
+    'RhymeSignature', ['word', 'phonemes', 'end_sound', 'consonant_start', 'rhyme_keys'])
+
 if not os.path.exists(PHONEME_DATA_DIR):
     os.makedirs(PHONEME_DATA_DIR)
 
@@ -49,6 +75,75 @@ def rhymer_for_language(lang, debug=False):
         raise Exception('lang %s is unsupported' % lang)
 
 
+def build_doubled_endings(path, lang='en', words=None):
+    """
+    precomputes the words that _normalize_word shortens: for every real word
+    ending in one of DOUBLE_END_LETTERS_EN whose doubled form isn't a word,
+    maps the doubled form to the word ('helloo' -> 'hello').
+    the table is written as a snapshot, so using it doesn't load the wordlist.
+    a table built from the language's wordlist records utils.wordlist_stamp
+    under DOUBLED_ENDINGS_STAMP_KEY, so that it can be rebuilt when the
+    wordlist changes. returns the number of entries written.
+    """
+    items = list()
+    if words is None:
+        stamp = utils.wordlist_stamp(lang)
+        items.append((DOUBLED_ENDINGS_STAMP_KEY, stamp.encode('utf-8')))
+        words = utils.load_words(lang)
+    # the stamp isn't an entry
+    stamped = len(items)
+    for word in words:
+        if len(word) > 1 and word[-1] in DOUBLE_END_LETTERS_EN and word[-2] != word[-1]:
+            doubled = word + word[-1]
+            if doubled not in words:
+                items.append((doubled.encode('utf-8'), word.encode('utf-8')))
+    return snapshot.write_snapshot(path, items) - stamped
+
+
+def count_nuclei(phonemes):
+    """
+    the number of syllables in an ipa string: its vowel nuclei, counting
+    diphthongs once and a vowel after a stress mark as a new syllable,
+    plus any syllabic consonants.
+    """
+    count = 0
+    nucleus = ''
+    for char in phonemes:
+        if char in syllable_vowels:
+            if len(nucleus) == 1 and nucleus + char in diphthongs:
+                nucleus += char
+            else:
+                count += 1
+                nucleus = char
+        elif char == SYLLABIC_MARK:
+            count += 1
+            nucleus = ''
+        elif char not in length_marks:
+            nucleus = ''
+    return count
+
+
+def is_rhyme_signatures(sig1, sig2, depth=1):
+    """like PhonemeRhymer.is_rhyme, for two precomputed RhymeSignatures"""
+    if sig1.phonemes and sig2.phonemes:
+        if sig1.rhyme_keys[depth - 1] == sig2.rhyme_keys[depth - 1]:
+            return not signatures_homophonic(sig1, sig2)
+    return False
+
+
+def signatures_homophonic(sig1, sig2):
+    if sig1.phonemes == sig2.phonemes:
+        return True
+
+    # if the shorter word begins with a consonant we return True
+    # if the longer word contains all the shorter's phonemes
+    if len(sig1.phonemes) <= len(sig2.phonemes):
+        shorter, longer = sig1, sig2
+    else:
+        shorter, longer = sig2, sig1
+    return shorter.consonant_start and longer.phonemes.endswith(shorter.phonemes)
+
+
 class PhonemeRhymer(object):
     """docstring for RhymeDB"""
 
@@ -57,78 +152,640 @@ class PhonemeRhymer(object):
         'fr': 'fr'
         }
 
-    def __init__(self, basepath, lang, dbpath=None, debug=False):
+    def __init__(self, basepath, lang, dbpath=None, debug=False, flush_every=100,
+                 cache_size=10000, espeak_workers=4, snapshot_path=None, indexpath=None,
+                 backend='dbm', lexicon_path=None, unresolvedpath=None,
+                 unresolved_ttl=7 * 24 * 60 * 60, unresolved_max=50000,
+                 doubled_endings_path=None, rhyme_depth=1):
         super(PhonemeRhymer, self).__init__()
         self.basepath = basepath
         self.lang = lang
-        self.dbpath = dbpath or os.path.join(self.basepath, 'phonemes_%s.db' % self.lang)
+        # the store class used for the db and the rhyme index
+        self.backend = stores.get_backend(backend)
+        self.dbpath = dbpath or os.path.join(
+            self.basepath, 'phonemes_%s%s' % (self.lang, self.backend.extension))
+        # end sound -> newline separated words with that end sound
+        self.indexpath = indexpath or '%s_rhymes%s' % (
+            os.path.splitext(self.dbpath)[0], self.backend.extension)
+        # a negative cache: word -> time, phonemes, for words espeak can't do
+        # much with. these are kept out of the db, and retried after the ttl.
+        self.unresolvedpath = unresolvedpath or '%s_unresolved%s' % (
+            os.path.splitext(self.dbpath)[0], self.backend.extension)
+        self.unresolved_ttl = unresolved_ttl
+        self.unresolved_max = unresolved_max
+        self.unresolved_hits = 0
+        # words sent to the negative cache, rather than the db
+        self.unresolved_added = 0
+        self._unresolved_count = None
         self.new_words = 0
         self.db = None
+        self.index_db = None
+        self.unresolved_db = None
+        self._index_pending = defaultdict(set)
+        self._schema_current = False
         self.debug = debug
+        if not 1 <= rhyme_depth <= MAX_RHYME_DEPTH:
+            raise ValueError('rhyme_depth must be between 1 and %d' % MAX_RHYME_DEPTH)
+        # the number of vowel nuclei that have to match for words to rhyme
+        self.rhyme_depth = rhyme_depth
+        self.flush_every = flush_every
+        self._session_depth = 0
+        # normalized word -> adjusted phonemes, for hot words
+        self.cache = utils.LRUCache(cache_size)
+        # normalized word -> RhymeSignature
+        self.signatures = utils.LRUCache(cache_size)
+        # raw word -> normalized word
+        self.normalized = utils.LRUCache(cache_size)
+        # built from the wordlist on first use, and rebuilt when the wordlist
+        # changes, see build_doubled_endings. a table passed in is used as is.
+        self._check_doubled_endings = doubled_endings_path is None
+        self.doubled_endings_path = doubled_endings_path or os.path.join(
+            self.basepath, 'doubled_endings_%s.snapshot' % self.lang)
+        self._doubled_endings = None
+        self._near_index = None
+        self.espeak_workers = espeak_workers
+        self._espeak_pool = None
+        # an optional read-only tier, checked before the db
+        self.snapshot = snapshot.PhonemeSnapshot(snapshot_path) if snapshot_path else None
+        # an optional static word -> ipa lexicon, checked before espeak
+        self.lexicon = lexicon.load_lexicon(lexicon_path) if lexicon_path else dict()
+        self.lexicon_hits = 0
 
     def __len__(self):
-        self.open_db()
-        dblen = len(self.db)
-        self.close_db()
-        return dblen
+        with self._open_db() as db:
+            return len(db) - (1 if SCHEMA_KEY in db else 0)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-    def open_db(self):
-        self.db = dbm.open(self.dbpath, DBM_FLAGS)
+    @property
+    def in_session(self):
+        return self._session_depth > 0
+
+    def open(self):
+        """
+        starts a session: the db stays open until the matching close(),
+        and new entries are synced every `flush_every` writes instead of
+        one at a time. sessions can be nested.
+        """
+        if not self._session_depth:
+            self.close_db()
+            self.open_db(session=True)
+        self._session_depth += 1
+
+    def close(self):
+        """ends a session, flushing any pending writes"""
+        if not self._session_depth:
+            return
+        self._session_depth -= 1
+        if not self._session_depth:
+            self.flush()
+            self.close_db()
+            for attr in ('index_db', 'unresolved_db'):
+                if getattr(self, attr) is not None:
+                    getattr(self, attr).close()
+                    setattr(self, attr, None)
+            if self._espeak_pool is not None:
+                self._espeak_pool.close()
+
+    def flush(self):
+        """syncs pending writes to disk"""
+        self._flush_index()
+        if self.unresolved_db is not None:
+            self.unresolved_db.sync()
+        if self.db is not None and self.new_words:
+            self.db.sync()
+            self.new_words = 0
+
+    def open_db(self, session=False):
+        self.db = self.backend(self.dbpath, session=session)
         self.new_words = 0
+        if not self._schema_current:
+            self._schema_current = self._check_schema()
+
+    def _check_schema(self):
+        """returns True if the db is stamped as current, stamping new dbs"""
+        if SCHEMA_KEY in self.db:
+            return self.db[SCHEMA_KEY].decode('utf-8') == str(RECORD_VERSION)
+        if self.db.is_empty():
+            self._stamp_schema()
+            return True
+        return False
+
+    def _stamp_schema(self):
+        self.db[SCHEMA_KEY] = str(RECORD_VERSION).encode('utf-8')
+
+    def _word_keys(self):
+        """all keys in the open db, except for metadata"""
+        return [k for k in self.db.keys() if k != SCHEMA_KEY]
 
     def close_db(self):
         if self.db is not None:
             self.db.close()
             self.db = None
 
+    @contextlib.contextmanager
+    def _open_db(self):
+        """
+        yields the open db. outside of a session the db is opened
+        for the duration of the block only.
+        """
+        if self.db is not None:
+            yield self.db
+            return
+        self.open_db()
+        try:
+            yield self.db
+        finally:
+            self._flush_index()
+            self.close_db()
+
+    @contextlib.contextmanager
+    def _open_store(self, attr, path):
+        """like _open_db, for the secondary stores kept in attr"""
+        store = getattr(self, attr)
+        if store is not None:
+            yield store
+            return
+        if self.in_session:
+            # closed at the end of the session
+            store = self.backend(path, session=True)
+            setattr(self, attr, store)
+            yield store
+            return
+        store = self.backend(path)
+        setattr(self, attr, store)
+        try:
+            yield store
+        finally:
+            store.close()
+            setattr(self, attr, None)
+
+    def _open_index(self):
+        return self._open_store('index_db', self.indexpath)
+
+    def _open_unresolved(self):
+        return self._open_store('unresolved_db', self.unresolvedpath)
+
+    def _store(self, word, entry):
+        self.db[word.encode('utf-8')] = self._encode_entry(entry).encode('utf-8')
+        if len(entry.phonemes) > 1 and entry.end_sound:
+            self._index_pending[entry.end_sound].add(word)
+        self.new_words += 1
+        if self.in_session and self.new_words >= self.flush_every:
+            self.flush()
+
+    def _flush_index(self):
+        """
+        merges words stored since the last flush into the rhyme index.
+        updates are batched because index values for common end sounds
+        get long, and are rewritten in full.
+        """
+        if not self._index_pending:
+            return
+        pending, self._index_pending = self._index_pending, defaultdict(set)
+        # values are read and rewritten in one transaction, so that other
+        # processes sharing the index don't lose each other's words
+        with self._open_index() as index, index.transaction():
+            for sound, words in pending.items():
+                key = sound.encode('utf-8')
+                known = index[key].decode('utf-8').split('\n') if key in index else []
+                new_words = sorted(words.difference(known))
+                if new_words:
+                    index[key] = '\n'.join(known + new_words).encode('utf-8')
+                    if self._near_index is not None:
+                        self._near_index.add(sound, new_words)
+            index.sync()
+
+    def rebuild_rhyme_index(self):
+        """recreates the rhyme index from the contents of the db"""
+        self._near_index = None
+        if self.index_db is not None:
+            self.index_db.close()
+            self.index_db = None
+        self.backend(self.indexpath, new=True).close()
+        with self._open_db() as db:
+            for key in self._word_keys():
+                word = key.decode('utf-8')
+                entry = self._value_entry(db[key].decode('utf-8'))
+                if len(entry.phonemes) > 1 and entry.end_sound:
+                    self._index_pending[entry.end_sound].add(word)
+            self._flush_index()
+
+    def rhymes_for_word(self, word, limit=None, depth=None):
+        """
+        returns known words that rhyme with word, using the rhyme index.
+        homophones of word are excluded.
+        """
+        depth = depth or self.rhyme_depth
+        sig = self.signature(word)
+        if len(sig.phonemes) <= 1 or not sig.end_sound:
+            return []
+        self._flush_index()
+        key = sig.end_sound.encode('utf-8')
+        with self._open_index() as index:
+            candidates = index[key].decode('utf-8').split('\n') if key in index else []
+
+        rhymes = list()
+        # candidates that aren't cached are read with the db held open for all of them
+        with self._open_db():
+            for candidate in candidates:
+                if limit and len(rhymes) >= limit:
+                    break
+                if is_rhyme_signatures(sig, self.signature(candidate), depth):
+                    rhymes.append(candidate)
+        return rhymes
+
+    def near_rhymes(self, word, k=10, threshold=None):
+        """
+        returns up to k known words that nearly rhyme with word, nearest first.
+        see nearrhyme.NearRhymeIndex; this requires numpy.
+        """
+        if self._near_index is None:
+            from . import nearrhyme
+            self._near_index = nearrhyme.NearRhymeIndex(self)
+        return self._near_index.near_rhymes(word, k, threshold)
+
     def get_phonemes(self, word):
         '''returns the IPA phonemes for word, calculating them if needed'''
+        return self.get_entry(word).phonemes
+
+    def get_entry(self, word):
+        """returns the PhonemeEntry for word, calculating it if needed"""
+        assert utils.isstring(word), 'key must be string'
+        return self._cached_entry(self._normalize_word(word))
+
+    def _cached_entry(self, word):
+        entry = self.cache.get(word)
+        if entry is not None:
+            return entry
+        entry = self._get_stored_entry(word)
+        self.cache.put(word, entry)
+        return entry
+
+    def signature(self, word):
+        """returns the RhymeSignature for word, calculating it if needed"""
         assert utils.isstring(word), 'key must be string'
         word = self._normalize_word(word)
-        word = word.encode('utf-8')
-        try:
-            self.open_db()
-            if word not in self.db:
-                _, phonemes = espeak_wrapper.extract_phonemes(word, self.lang)
-                self.db[word] = self._adjust_phonemes(phonemes).encode('utf-8')
-            phonemes = self.db[word].decode('utf-8')
-            # we have some bad entries in the database from before we did phoneme adjustment
-            if phonemes != self._adjust_phonemes(phonemes):
-                self.db[word] = self._adjust_phonemes(phonemes).encode('utf-8')
-                print('adjusted phonemes for %s' % phonemes, file=sys.stderr)
-                return self.db[word].decode('utf-8')
-            return phonemes
-        finally:
-            self.close_db()
+        sig = self.signatures.get(word)
+        if sig is None:
+            sig = self._make_signature(word, self._cached_entry(word))
+            self.signatures.put(word, sig)
+        return sig
+
+    def _make_signature(self, word, entry):
+        consonant_start = bool(entry.phonemes) and entry.phonemes[0] not in ipa_vowels
+        return RhymeSignature(
+            word, entry.phonemes, entry.end_sound, consonant_start, entry.rhyme_keys)
+
+    def _get_stored_entry(self, word):
+        entry = self._snapshot_entry(word)
+        if entry is not None:
+            return entry
+        with self._open_db():
+            entry = self._read_entry(word)
+            if entry is None:
+                entry = self._resolve([word])[word]
+            return entry
+
+    def _resolve(self, words):
+        """
+        returns a dict of word -> entry for words not in the db, and records them.
+        words in the negative cache are served from there, the rest are phonemized.
+        the db must be open.
+        """
+        entries = self._lookup_unresolved(words)
+        missing = [w for w in words if w not in entries]
+        if missing:
+            new_entries = dict((w, self._make_entry(p))
+                               for w, p in self._phonemize(missing).items())
+            self._record_entries(new_entries)
+            entries.update(new_entries)
+        return entries
+
+    def _phonemize(self, words):
+        """
+        returns a dict of word -> raw phonemes for words not in the db,
+        from the lexicon where possible, and from espeak otherwise.
+        """
+        results = dict()
+        unknown = list()
+        for w in words:
+            phonemes = self.lexicon.get(w)
+            if phonemes is None:
+                unknown.append(w)
+            else:
+                results[w] = phonemes
+        self.lexicon_hits += len(results)
+        if len(unknown) == 1:
+            results[unknown[0]] = espeak_wrapper.extract_phonemes(unknown[0], self.lang)[1]
+        elif unknown:
+            results.update(self.espeak_pool.extract(unknown))
+        return results
+
+    def _is_degenerate(self, entry):
+        """entries too short to rhyme: espeak failed, or the word is junk"""
+        return len(entry.phonemes) <= 1
+
+    def _record_entries(self, entries):
+        """
+        stores new entries: good ones in the db, degenerate ones
+        in the negative cache. the db must be open.
+        returns the number stored in the db.
+        """
+        unresolved = dict()
+        for word, entry in entries.items():
+            if self._is_degenerate(entry):
+                unresolved[word] = entry
+            else:
+                self._store(word, entry)
+        self.unresolved_added += len(unresolved)
+        if not unresolved:
+            return len(entries)
+
+        now = int(time.time())
+        with self._open_unresolved() as store, store.transaction():
+            if self._unresolved_count is None or store.shared:
+                # other processes may have added to it since we last counted
+                self._unresolved_count = len(store)
+            for word, entry in unresolved.items():
+                key = word.encode('utf-8')
+                if key not in store:
+                    self._unresolved_count += 1
+                store[key] = ('%d\t%s' % (now, entry.phonemes)).encode('utf-8')
+            if self._unresolved_count > self.unresolved_max:
+                self._prune_unresolved(store, now)
+        return len(entries) - len(unresolved)
+
+    def _lookup_unresolved(self, words):
+        """returns a dict of word -> entry for words in the negative cache"""
+        entries = dict()
+        if not words:
+            return entries
+        now = int(time.time())
+        with self._open_unresolved() as store:
+            for word in words:
+                key = word.encode('utf-8')
+                if key not in store:
+                    continue
+                stamp, phonemes = store[key].decode('utf-8').split('\t', 1)
+                if now - int(stamp) > self.unresolved_ttl:
+                    # expired: give espeak another go
+                    continue
+                entries[word] = self._make_entry(phonemes)
+        self.unresolved_hits += len(entries)
+        return entries
+
+    def _prune_unresolved(self, store, now):
+        """drops expired entries from the negative cache, and then the oldest ones"""
+        stamps = list()
+        for key in store.keys():
+            stamp = int(store[key].decode('utf-8').split('\t', 1)[0])
+            if now - stamp > self.unresolved_ttl:
+                del store[key]
+            else:
+                stamps.append((stamp, key))
+        # prune to below the limit, so we don't do this on every write
+        excess = len(stamps) - int(self.unresolved_max * 0.9)
+        if excess > 0:
+            stamps.sort()
+            for _, key in stamps[:excess]:
+                del store[key]
+        self._unresolved_count = len(stamps) - max(excess, 0)
+
+    def _read_entry(self, word):
+        """returns the stored entry for word, or None. the db must be open."""
+        key = word.encode('utf-8')
+        if key not in self.db:
+            return None
+        value = self.db[key].decode('utf-8')
+        if self._schema_current:
+            return self._fields_entry(value.split('\t')[1:])
+        entry = self._decode_entry(value)
+        if entry is None:
+            entry = self._upgrade_entry(word, value)
+        return entry
+
+    def _snapshot_entry(self, word):
+        if self.snapshot is None:
+            return None
+        value = self.snapshot.get(word.encode('utf-8'))
+        if value is None:
+            return None
+        return self._value_entry(value.decode('utf-8'))
 
-    def is_rhyme(self, text1, text2):
-        w1 = self.rhyme_word(text1)
-        w2 = self.rhyme_word(text2)
+    def _upgrade_entry(self, word, value):
+        """rebuilds and rewrites a legacy or out of date db value"""
+        if not value.startswith(RECORD_MARK):
+            # we have some bad entries in the database from before we did phoneme adjustment
+            if value != self._adjust_phonemes(value):
+                print('adjusted phonemes for %s' % value, file=sys.stderr)
+        entry = self._value_entry(value)
+        self._store(word, entry)
+        return entry
+
+    def _value_entry(self, value):
+        """returns the entry for any stored value, current or not"""
+        entry = self._decode_entry(value)
+        if entry is None:
+            phonemes = value.split('\t')[1] if value.startswith(RECORD_MARK) else value
+            entry = self._make_entry(phonemes)
+        return entry
+
+    def _make_entry(self, phonemes):
+        """builds an entry from raw espeak output"""
+        phonemes = self._adjust_phonemes(phonemes)
+        if not phonemes:
+            return PhonemeEntry(phonemes, '', ('',) * MAX_RHYME_DEPTH, 0)
+        end_sound = self._end_sound(phonemes).lstrip('ˈˌ')
+        return PhonemeEntry(phonemes, end_sound, self._rhyme_keys(phonemes, end_sound),
+                            count_nuclei(phonemes))
+
+    def _rhyme_keys(self, phonemes, end_sound):
+        """
+        the rhyme keys for depths 1 to MAX_RHYME_DEPTH. past depth 1, stress
+        is ignored, and words with fewer nuclei than the depth use all their phonemes.
+        """
+        stripped = ''.join(c for c in phonemes if c not in stress_marks)
+        nuclei = [idx for idx, c in enumerate(stripped)
+                  if c in ipa_vowels and (idx == 0 or stripped[idx - 1] not in ipa_vowels)]
+        keys = [end_sound]
+        for depth in range(2, MAX_RHYME_DEPTH + 1):
+            keys.append(stripped[nuclei[-depth]:] if len(nuclei) >= depth else stripped)
+        return tuple(keys)
+
+    def _encode_entry(self, entry):
+        return '%s%d\t%s\t%s\t%s\t%d' % (
+            RECORD_MARK, RECORD_VERSION, entry.phonemes, entry.end_sound,
+            KEY_SEP.join(entry.rhyme_keys), entry.syllables)
+
+    def _fields_entry(self, fields):
+        return PhonemeEntry(fields[0], fields[1], tuple(fields[2].split(KEY_SEP)), int(fields[3]))
+
+    def _decode_entry(self, value):
+        """returns None if value isn't a current record"""
+        if not value.startswith(RECORD_MARK):
+            return None
+        fields = value.split('\t')
+        if fields[0][1:] != str(RECORD_VERSION) or len(fields) != len(PhonemeEntry._fields) + 1:
+            return None
+        return self._fields_entry(fields[1:])
 
-        p1 = self.get_phonemes(w1)
-        p2 = self.get_phonemes(w2)
+    def upgrade_db(self):
+        """
+        rewrites every legacy or out of date entry in the db as a current record,
+        and stamps the db as current. returns the number of entries rewritten.
+        """
+        upgraded = 0
+        with self._open_db() as db:
+            for key in self._word_keys():
+                value = db[key].decode('utf-8')
+                if self._decode_entry(value) is None:
+                    self._upgrade_entry(key.decode('utf-8'), value)
+                    upgraded += 1
+            self._stamp_schema()
+            self._schema_current = True
+            self.flush()
+        return upgraded
+
+    def export_snapshot(self, path=None):
+        """
+        writes the contents of the db to a read-only snapshot file,
+        for use with the snapshot_path argument.
+        returns the number of entries written.
+        """
+        path = path or os.path.join(self.basepath, 'phonemes_%s.snapshot' % self.lang)
+        with self._open_db() as db:
+            items = list()
+            for key in self._word_keys():
+                entry = self._value_entry(db[key].decode('utf-8'))
+                items.append((key, self._encode_entry(entry).encode('utf-8')))
+        return snapshot.write_snapshot(path, items)
+
+    def prefetch(self, words):
+        """
+        resolves the phonemes for a batch of upcoming words.
+        words are deduped, everything already stored is looked up in one pass,
+        and the misses are phonemized in parallel.
+        returns the number of words that weren't in the db.
+        """
+        words = set(self._normalize_word(w) for w in words if w)
+        words = [w for w in words if w not in self.cache]
+        if self.snapshot is not None:
+            unresolved = list()
+            for w in words:
+                entry = self._snapshot_entry(w)
+                if entry is None:
+                    unresolved.append(w)
+                else:
+                    self.cache.put(w, entry)
+            words = unresolved
+        if not words:
+            return 0
+
+        missing = list()
+        with self._open_db():
+            for w in words:
+                entry = self._read_entry(w)
+                if entry is None:
+                    missing.append(w)
+                else:
+                    self.cache.put(w, entry)
+
+        if missing:
+            with self._open_db():
+                entries = self._resolve(missing)
+            for w, entry in entries.items():
+                self.cache.put(w, entry)
+        return len(missing)
+
+    def stats(self):
+        """counters for the lookup tiers in front of espeak, and for espeak itself"""
+        return {
+            'cache': self.cache.stats(),
+            'lexicon_hits': self.lexicon_hits,
+            'unresolved_hits': self.unresolved_hits,
+            'unresolved_added': self.unresolved_added,
+            'espeak': espeak_wrapper.stats.as_dict(),
+        }
 
-        if len(p1) and len(p2):
-            s1 = self._end_sound(p1)
-            s2 = self._end_sound(p2)
+    def group_by_rhyme(self, lines, key=None, min_group=2, depth=None):
+        """
+        groups a batch of lines by rhyme, in one pass. lines are strings,
+        or items with their text under key.
+        returns a list of rhyme groups, biggest first. each group is a list of
+        lists of homophonous lines, and has at least min_group of those.
+        depth defaults to the rhymer's rhyme_depth.
+        """
+        depth = depth or self.rhyme_depth
+        line_words = list()
+        for line in lines:
+            line_words.append((line, self.rhyme_word(line[key] if key else line)))
+        self.prefetch([w for _, w in line_words if w])
+
+        # end sound -> phonemes -> lines
+        buckets = defaultdict(lambda: defaultdict(list))
+        for line, word in line_words:
+            if not word:
+                continue
+            sig = self.signature(word)
+            if len(sig.phonemes) > 1 and sig.end_sound:
+                buckets[sig.rhyme_keys[depth - 1]][sig.phonemes].append(line)
+
+        groups = list()
+        for by_phonemes in buckets.values():
+            if len(by_phonemes) < min_group:
+                continue
+            homophones = defaultdict(list)
+            for phonemes, homophone_lines in by_phonemes.items():
+                homophones[self._homophone_key(phonemes, by_phonemes)].extend(homophone_lines)
+            if len(homophones) >= min_group:
+                groups.append(list(homophones.values()))
+        groups.sort(key=len, reverse=True)
+        return groups
+
+    def _homophone_key(self, phonemes, known):
+        """
+        the shortest of the known phonemes that are homophonic with phonemes,
+        by the same rule as signatures_homophonic: a suffix starting with a consonant.
+        """
+        for idx in range(len(phonemes) - 1, 0, -1):
+            suffix = phonemes[idx:]
+            if suffix in known and suffix[0] not in ipa_vowels:
+                return suffix
+        return phonemes
 
-            if self.debug:
-                print(text1, text2, w1, w2, p1, p2, s1, s2)
-            if s1.lstrip('ˈˌ') == s2.lstrip('ˈˌ'):
-                return not self._are_homophonic(p1, p2)
-            elif self.debug:
-                print('no rhyme')
+    @property
+    def espeak_pool(self):
+        if self._espeak_pool is None:
+            self._espeak_pool = espeak_wrapper.EspeakPool(
+                self.lang, workers=self.espeak_workers)
+        return self._espeak_pool
 
-        return False
+    def is_rhyme(self, text1, text2, depth=None):
+        """depth defaults to the rhymer's rhyme_depth"""
+        w1 = self.rhyme_word(text1)
+        w2 = self.rhyme_word(text2)
 
-    def sound_for_word(self, word):
-        '''this is sort of legacy: it used to presume it might use different
-        functions to get different sounds from a word?'''
-        p = self.get_phonemes(word)
-        if len(p) <= 1:
-            print('too few phonemes in word %s (%s)' % (word, p), file=sys.stderr)
+        sig1 = self.signature(w1)
+        sig2 = self.signature(w2)
+        if self.debug:
+            print(text1, text2, w1, w2)
+            print(sig1.phonemes, sig2.phonemes, sig1.end_sound, sig2.end_sound)
+        return is_rhyme_signatures(sig1, sig2, depth or self.rhyme_depth)
+
+    def sound_for_word(self, word, depth=None):
+        '''returns the rhyme key for word at depth, which defaults to the
+        rhymer's rhyme_depth. at depth 1 this is the end sound.'''
+        entry = self.get_entry(word)
+        if len(entry.phonemes) <= 1:
+            print('too few phonemes in word %s (%s)' % (word, entry.phonemes), file=sys.stderr)
             return None
-        return self._end_sound(p)
+        return entry.rhyme_keys[(depth or self.rhyme_depth) - 1]
 
     def _adjust_phonemes(self, phonemes):
         """
@@ -157,27 +814,53 @@ class PhonemeRhymer(object):
         if not word or not len(word):
             raise ValueError('expected string')
 
+        normalized = self.normalized.get(word)
+        if normalized is None:
+            normalized = self._normalize(word)
+            self.normalized.put(word, normalized)
+        return normalized
+
+    def _normalize(self, word):
         word = word.lower()
         # handle lolllll and uhhhh and haahhhh
         if len(word) > 2:
             if word[-1] == word[-2]:
-                pattern = word[-1] + '+$'
+                stem = word.rstrip(word[-1])
                 if self.lang == 'en' and word[-1] in DOUBLE_END_LETTERS_EN:
                     # ass != as, e.g.
-                    repl = word[-1] * 2
-                    word = re.sub(pattern, repl, word)
+                    word = stem + word[-1] * 2
 
                     # we want melee not mele, but home not homee:
-                    if not utils.is_real_word(word, self.lang):
-                        if utils.is_real_word(word[:-1], self.lang):
-                            return word[:-1]
+                    shortened = self.doubled_endings.get(word.encode('utf-8'))
+                    if shortened is not None:
+                        return shortened.decode('utf-8')
                 else:
                     # matt == mat, hatt == hat, e.g.
-                    repl = word[-1]
-                    word = re.sub(pattern, repl, word)
+                    word = stem + word[-1]
 
         return word
 
+    @property
+    def doubled_endings(self):
+        if self._doubled_endings is None:
+            table = None
+            if os.path.exists(self.doubled_endings_path):
+                table = snapshot.PhonemeSnapshot(self.doubled_endings_path)
+                if self._check_doubled_endings and not self._doubled_endings_current(table):
+                    table.close()
+                    table = None
+            if table is None:
+                count = build_doubled_endings(self.doubled_endings_path, self.lang)
+                print('built doubled endings table (%d entries)' % count, file=sys.stderr)
+                table = snapshot.PhonemeSnapshot(self.doubled_endings_path)
+            self._doubled_endings = table
+        return self._doubled_endings
+
+    def _doubled_endings_current(self, table):
+        """whether table was built from the wordlist as it is now"""
+        stamp = table.get(DOUBLED_ENDINGS_STAMP_KEY)
+        return stamp is not None and stamp.decode('utf-8') == utils.wordlist_stamp(self.lang)
+
     def _end_sound(self, phonemes):
         if not phonemes or not len(phonemes):
             raise ValueError('phonemes cannot be None')
@@ -208,96 +891,85 @@ class PhonemeRhymer(object):
                     break
             return ''.join(reversed(p[:idx+1]))
 
-    def _are_homophonic(self, phonemes1, phonemes2):
-        if phonemes1 == phonemes2:
-            return True
-
-        # if the shorter word begins with a consonant we return True
-        # if the longer word contains all the shorter's phonemes
-
-        shorter = min([phonemes1, phonemes2], key=lambda x: len(x))
-        longer = phonemes1 if shorter == phonemes2 else phonemes2
-
-        if shorter[0] not in ipa_vowels:
-            if longer[-len(shorter):] == shorter:
-                return True
-
-        return False
-
-    def add_new_words(self, wordlist):
+    def add_new_words(self, wordlist, workers=None, chunksize=50, batch_size=1000):
         """
-        add new words to our lookup table
+        add new words to our lookup table, as a stream: chunks of chunksize
+        words are phonemized by a pool of worker processes, and results are
+        written and synced every batch_size words. words that are already
+        stored are skipped, so an interrupted import can just be run again.
+        returns the number of words added to the db; words without usable
+        phonemes go to the negative cache instead, see unresolved_added.
         """
-        self.open_db()
-        try:
-            wordlist = [self._normalize_word(w) for w in wordlist
-                        if w.encode('utf-8') not in self.db]
-            num_words = len(wordlist)
-            print('extracting phonemes for %d new words' % num_words)
+        workers = workers or self.espeak_workers
+        with self:
+            words = self._unstored_words(wordlist)
+            num_words = len(words)
+            print('extracting phonemes for %d new words' % num_words, file=sys.stderr)
             start = time.time()
-            pool = multiprocessing.Pool(4)
-            pool_func = functools.partial(espeak_wrapper.extract_phonemes, lang=self.lang)
-            result = pool.map_async(pool_func, wordlist)
-
-            # wait for result
-            while True:
-                if result.ready():
-                    break
-                else:
-                    print("%d/%d\r" % (num_words, result._number_left), file=sys.stdout)
-                    sys.stdout.flush()
-                    time.sleep(1)
-
-            for w, p in result.get():
-                self.db[w.encode('utf-8')] = self._adjust_phonemes(p).encode('utf-8')
-            print('finished in %0.2f' % (time.time() - start))
-        finally:
-            self.close_db()
-
-
-# def rhymes_for_lines(lines, textkey=None):
-#     """
-#     takes an iterable containing lines of text
-#     returns them grouped by rhyme
-#     returns a list of lists of homophones
-#     """
-
-#     open_db()
-#     organized_rhyme = defaultdict(list)
-
-#     fails = 0
-#     for l in lines:
-#         try:
-#             w = rhyme_word(l)
-#             if w:
-#                 p = get_phonemes(w)
-#                 e = _end_sound(p)
-#                 organized_rhyme[e].append((l, p))
-#         except ValueError:
-#             fails += 1
-
-#     print('failed to find rhyme words in %d lines' % fails)
-
-#     # now we'd like to sort based on homophones?
-#     results = list()
-
-#     for key, value in organized_rhyme.items():
-#         if len(value) > 1:
-#             results.append(_sort_rhymes(value))
-
-#     close_db()
-#     return results
-
-
-# def _sort_rhymes(rhymes):
-#     # for a list of rhymes, sort them by homophones
-#     sorted_rhymes = defaultdict(list)
-#     for line, phonemes in rhymes:
-#         sorted_rhymes[phonemes].append(line)
+            added = 0
+            done = 0
+            unresolved = self.unresolved_added
+
+            batch = dict((w, self._make_entry(self.lexicon[w])) for w in words if w in self.lexicon)
+            self.lexicon_hits += len(batch)
+            words = [w for w in words if w not in batch]
+            chunks = [words[i:i + chunksize] for i in range(0, len(words), chunksize)]
+
+            pool = multiprocessing.Pool(workers)
+            try:
+                pool_func = functools.partial(_extract_chunk, lang=self.lang)
+                for results in pool.imap_unordered(pool_func, chunks):
+                    for w, p in results:
+                        batch[w] = self._make_entry(p)
+                    if len(batch) >= batch_size:
+                        added += self._write_batch(batch)
+                        done += len(batch)
+                        batch = dict()
+                        elapsed = time.time() - start
+                        print('%d/%d words, %0.1f words/s' % (
+                            done, num_words, done / elapsed), file=sys.stderr)
+                added += self._write_batch(batch)
+                pool.close()
+            except BaseException:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+
+            elapsed = time.time() - start
+            print('finished %d words in %0.2fs (%0.1f words/s): %d added, %d unresolved' % (
+                num_words, elapsed, num_words / elapsed if elapsed else 0,
+                added, self.unresolved_added - unresolved), file=sys.stderr)
+        return added
+
+    def _unstored_words(self, wordlist):
+        """normalized, deduped words from wordlist that aren't in the db or the negative cache"""
+        words = list()
+        seen = set()
+        for w in wordlist:
+            if not w:
+                continue
+            w = self._normalize_word(w)
+            if w not in seen:
+                seen.add(w)
+                words.append(w)
+        unresolved = self._lookup_unresolved(words)
+        return [w for w in words if w not in unresolved and w.encode('utf-8') not in self.db]
+
+    def _write_batch(self, entries):
+        """
+        records entries and syncs them, so they survive a crash.
+        returns the number stored in the db.
+        """
+        stored = self._record_entries(entries)
+        self.flush()
+        return stored
 
-#     # TODO: now check keys for homophonity
 
-#     return sorted_rhymes.values()
+def _extract_chunk(words, lang):
+    """phonemizes a chunk of words in a worker process, with one espeak run where possible"""
+    with espeak_wrapper.EspeakPool(lang, workers=1, batch_size=len(words)) as pool:
+        return list(pool.extract(words).items())
 
 
 # def UPDATE_PHONEME_LIST(phonemes=wordsets.custom_ipa):
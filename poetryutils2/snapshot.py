@@ -0,0 +1,113 @@
+# coding: utf-8
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import mmap
+import struct
+
+"""
+a compact, read-only key/value file for serving phoneme lookups.
+
+layout:
+    MAGIC
+    uint32 record count
+    uint32 offset of each record, relative to the start of the records,
+        in sorted key order
+    records, each: key bytes, TAB, value bytes, NEWLINE
+
+lookups binary search the offset table of an mmap of the file, so loading
+is instant, and forked processes share the same pages.
+"""
+
+MAGIC = b'PHSNAP01'
+_COUNT = struct.Struct('<I')
+_OFFSET = struct.Struct('<I')
+HEADER_SIZE = len(MAGIC) + _COUNT.size
+
+
+def write_snapshot(path, items):
+    """
+    writes (key, value) byte string pairs to a snapshot at path.
+    keys must not contain tabs or newlines, values must not contain newlines.
+    returns the number of records written.
+    """
+    items = sorted(items)
+    offsets = list()
+    records = list()
+    position = 0
+    for key, value in items:
+        record = key + b'\t' + value + b'\n'
+        offsets.append(position)
+        records.append(record)
+        position += len(record)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_COUNT.pack(len(records)))
+        for offset in offsets:
+            f.write(_OFFSET.pack(offset))
+        for record in records:
+            f.write(record)
+    os.rename(tmp_path, path)
+    return len(records)
+
+
+class PhonemeSnapshot(object):
+
+    """read-only, mmap backed access to a snapshot file"""
+
+    def __init__(self, path):
+        super(PhonemeSnapshot, self).__init__()
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError('%s is not a phoneme snapshot' % path)
+        self._count = _COUNT.unpack_from(self._mm, len(MAGIC))[0]
+        self._data_start = HEADER_SIZE + self._count * _OFFSET.size
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def _record_at(self, idx):
+        """returns (key, start of value) for the record at idx"""
+        offset = _OFFSET.unpack_from(self._mm, HEADER_SIZE + idx * _OFFSET.size)[0]
+        start = self._data_start + offset
+        tab = self._mm.find(b'\t', start)
+        return self._mm[start:tab], tab + 1
+
+    def get(self, key, default=None):
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key, value_start = self._record_at(mid)
+            if mid_key == key:
+                return self._mm[value_start:self._mm.find(b'\n', value_start)]
+            elif mid_key < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return default
+
+    def keys(self):
+        return [self._record_at(i)[0] for i in range(self._count)]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -6,19 +6,22 @@ from collections import defaultdict, Counter
 import sys
 import re
 import functools
+import itertools
 
 from . import rhyme, utils
-from .syllables import count_syllables
+from .syllables import count_syllables, count_syllables_many
 
 
 class Line(object):
     '''a line in a poem, with some associated metadata'''
 
-    def __init__(self, text, info=None, end_sound=None, syllable_count=None):
+    def __init__(self, text, info=None, end_sound=None, syllable_count=None,
+                 rhyme_signature=None):
         self._text = text
         self._info = info
         self._end_sound = end_sound
         self._syllable_count = syllable_count
+        self._rhyme_signature = rhyme_signature
 
     @property
     def text(self):
@@ -36,6 +39,10 @@ class Line(object):
     def syllable_count(self):
         return self._syllable_count
 
+    @property
+    def rhyme_signature(self):
+        return self._rhyme_signature
+
     def __repr__(self):
         return ("<Line: %s>" % self.text).encode('utf-8')
 
@@ -100,18 +107,36 @@ class Poet(object):
 
     """Poet is an abstract superclass for poem generators."""
 
-    def __init__(self, debug=False, lang='en'):
+    # subclasses that look up rhymes set this, so that chunked
+    # processing knows to prefetch phonemes for them.
+    uses_rhyme = False
+    # and subclasses that count syllables set this, so that chunked
+    # processing counts each chunk's syllables in one batch.
+    uses_syllables = False
+
+    def __init__(self, debug=False, lang='en', syllable_engine='heuristic'):
         super(Poet, self).__init__()
         self.lines_seen = 0
         self.debug = debug
         self.lang = lang
+        # see syllables.count_syllables
+        self.syllable_engine = syllable_engine
         self._poem_type = "base poem"
+        # line text -> syllable count, for the current chunk
+        self._chunk_syllables = dict()
 
     @property
     def poem_type(self):
         return self._poem_type
 
-    def generate_from_source(self, source, key=None, yield_lines=False):
+    def generate_from_source(self, source, key=None, yield_lines=False, chunk_size=None):
+        """
+        if chunk_size is set, source is read chunk_size items at a time,
+        and each chunk is passed to prefetch() before its lines are added.
+        """
+        if chunk_size:
+            source = self._prefetched_chunks(source, key, chunk_size)
+
         for item in source:
             if yield_lines:
                 yield self.normalize_line(item, key).text
@@ -125,10 +150,47 @@ class Poet(object):
             for p in poems:
                 yield p
 
+    def _prefetched_chunks(self, source, key, chunk_size):
+        source = iter(source)
+        while True:
+            chunk = list(itertools.islice(source, chunk_size))
+            if not chunk:
+                return
+            self.prefetch([self.normalize_line(item, key) for item in chunk])
+            for item in chunk:
+                yield item
+
+    def prefetch(self, lines):
+        """
+        called with a chunk of upcoming lines before they are added,
+        so that per-line lookups can be resolved in bulk.
+        """
+        lines = [l for l in lines if self._accepts(l)]
+        if self.uses_rhyme:
+            rhyme_finder = rhyme.rhymer_for_language(self.lang)
+            words = (rhyme_finder.rhyme_word(l.text) for l in lines)
+            rhyme_finder.prefetch([w for w in words if w])
+        if self.uses_syllables:
+            texts = [l.text for l in lines]
+            counts = count_syllables_many(texts, self.lang, self.syllable_engine)
+            self._chunk_syllables = dict(zip(texts, counts))
+
+    def _syllable_count(self, line):
+        """line's syllable count, from the current chunk if it was prefetched"""
+        if line.syllable_count is None:
+            count = self._chunk_syllables.get(line.text)
+            if count is None:
+                count = count_syllables(line.text, lang=self.lang, engine=self.syllable_engine)
+            line._syllable_count = count
+        return line.syllable_count
+
+    def _accepts(self, line):
+        return not (self.lang and line.info and line.info.get('lang', self.lang) != self.lang)
+
     def add_keyed_line(self, line, key=None):
         line = self.normalize_line(line, key)
         # skip lines not in our language
-        if self.lang and line.info and line.info.get('lang', self.lang) != self.lang:
+        if not self._accepts(line):
             return None
         self.lines_seen += 1
         poem = self._add_line(line)
@@ -155,10 +217,22 @@ class Rhymer(Poet):
     our only basic worry is quality checking our rhymes?
     """
 
-    def __init__(self, rhyme_count=2, **kwargs):
+    uses_rhyme = True
+
+    def __init__(self, rhyme_count=2, rhyme_depth=1, loose=False, loose_threshold=0.12,
+                 **kwargs):
         super(Rhymer, self).__init__(**kwargs)
         self.endings = defaultdict(list)
         self.rhyme_count = rhyme_count
+        # how many vowel nuclei have to match, see rhyme.PhonemeEntry
+        self.rhyme_depth = rhyme_depth
+        # in loose mode, lines with near rhyming end sounds are grouped
+        # together, see nearrhyme. this requires numpy.
+        self.loose = loose
+        self.loose_threshold = loose_threshold
+        if loose:
+            from . import nearrhyme
+            self._sounds = nearrhyme.EndSoundSpace()
         self._poem_type = "rhyme"
         self.rhyme_finder = rhyme.rhymer_for_language(self.lang)
 
@@ -169,8 +243,11 @@ class Rhymer(Poet):
         """
         end_word = self.rhyme_finder.rhyme_word(line.text)
         if end_word:
-            end_sound = self.rhyme_finder.sound_for_word(end_word)
+            end_sound = self.rhyme_finder.sound_for_word(end_word, self.rhyme_depth)
+            if self.loose and end_sound:
+                end_sound = self._loose_sound(end_sound)
             line._end_sound = end_sound
+            line._rhyme_signature = self.rhyme_finder.signature(end_word)
             if self.debug:
                 print(line, end_word, end_sound)
             if self.not_homophonic(line, end_sound):
@@ -185,9 +262,23 @@ class Rhymer(Poet):
                     self.endings[end_sound] = list()
                     return to_return
 
+    def _loose_sound(self, end_sound):
+        """the nearest end sound we've seen, or end_sound if there's nothing close"""
+        nearest = self._sounds.nearest(end_sound, self.loose_threshold)
+        if nearest:
+            return nearest[0]
+        self._sounds.add(end_sound)
+        return end_sound
+
     def not_homophonic(self, line, end_sound):
         for other_line in self.endings[end_sound]:
-            if not self.rhyme_finder.is_rhyme(line.text, other_line.text):
+            if self.loose:
+                rhymes = not rhyme.signatures_homophonic(
+                    line.rhyme_signature, other_line.rhyme_signature)
+            else:
+                rhymes = rhyme.is_rhyme_signatures(
+                    line.rhyme_signature, other_line.rhyme_signature, self.rhyme_depth)
+            if not rhymes:
                 # print('homophones:\n%s\n%s' % (line, other_line))
                 return False
 
@@ -203,6 +294,9 @@ class Coupler(Poet):
 
     """finds rhyming couplets"""
 
+    uses_rhyme = True
+    uses_syllables = True
+
     def __init__(self, syllable_counts=None, **kwargs):
         """finds rhyming couplets with equal syllable counts.
         :param syllable_counts: None or int or collection of ints or str .
@@ -223,7 +317,7 @@ class Coupler(Poet):
         self._poem_type = "couplet"
 
     def _add_line(self, line, raw=False):
-        syllable_count = count_syllables(line.text)
+        syllable_count = self._syllable_count(line)
         if not self.syllable_counts or syllable_count in self.syllable_counts:
             poem = self.rhymers[syllable_count]._add_line(line, raw=raw)
             if poem and not raw:
@@ -235,8 +329,10 @@ class SyllablePoet(Poet):
 
     """Generates poems with lines of given syllable counts"""
 
-    def __init__(self, line_syllables):
-        super(SyllablePoet, self).__init__()
+    uses_syllables = True
+
+    def __init__(self, line_syllables, **kwargs):
+        super(SyllablePoet, self).__init__(**kwargs)
         self.line_syllables = line_syllables
         self.desired_syllables_set = set(line_syllables)
         self.syllable_numbers = {
@@ -245,7 +341,7 @@ class SyllablePoet(Poet):
         self._poem_type = "syllable poem"
 
     def _add_line(self, line):
-        syllable_count = count_syllables(line.text)
+        syllable_count = self._syllable_count(line)
         if syllable_count in self.desired_syllables_set:
             self.lines[syllable_count].append(line)
             return self.check_for_art()
@@ -265,6 +361,9 @@ class Limericker(Poet):
 
     """finds limericks"""
 
+    uses_rhyme = True
+    uses_syllables = True
+
     def __init__(self, **kwargs):
         super(Limericker, self).__init__(**kwargs)
         self.lines = defaultdict(list)
@@ -272,7 +371,7 @@ class Limericker(Poet):
         self._poem_type = "limerick"
 
     def _add_line(self, line):
-        syllable_count = count_syllables(line.text)
+        syllable_count = self._syllable_count(line)
         new_rhyme = None
         if syllable_count == 6 or syllable_count == 9:
             new_rhyme = self.rhymers[syllable_count]._add_line(line, raw=True)
@@ -285,7 +384,8 @@ class Limericker(Poet):
         if len(self.lines[9]) and len(self.lines[6]):
             for niner in self.lines[9]:
                 for sixer in self.lines[6]:
-                    if not self.rhymers[9].rhyme_finder.is_rhyme(niner[0].text, sixer[0].text):
+                    if not rhyme.is_rhyme_signatures(
+                            niner[0].rhyme_signature, sixer[0].rhyme_signature):
                         self.lines[9].remove(niner)
                         self.lines[6].remove(sixer)
                         lines = [
@@ -304,6 +404,8 @@ class Haikuer(Poet):
 
     """writes boooootiful poem"""
 
+    uses_syllables = True
+
     def __init__(self, **kwargs):
         super(Haikuer, self).__init__(**kwargs)
         self.sevens = list()
@@ -316,7 +418,7 @@ class Haikuer(Poet):
         if self.debug:
             sys.stdout.write("seen %d\r" % self.lines_seen)
             sys.stdout.flush()
-        syllable_count = count_syllables(line.text)
+        syllable_count = self._syllable_count(line)
         if syllable_count == 5:
             self.fives.append(line)
 
@@ -340,15 +442,19 @@ class Haikuer(Poet):
 
 
 class FleurDuMal(Poet):
+    uses_rhyme = True
+    uses_syllables = True
+
     def __init__(self, **kwargs):
         super(FleurDuMal, self).__init__(**kwargs)
-        self.coupler = Coupler((12, 10))
+        self.coupler = Coupler(
+            (12, 10), lang=self.lang, syllable_engine=self.syllable_engine)
         self.couplets = defaultdict(list)
         self.rhyme_finder = rhyme.rhymer_for_language(self.lang)
         self._poem_type = 'baudelairist'
 
     def _add_line(self, line):
-        syllable_count = count_syllables(line.text, lang=self.lang)
+        syllable_count = self._syllable_count(line)
         if syllable_count in (10, 12):
             couplet = self.coupler._add_line(line, raw=True)
             if couplet:
@@ -358,7 +464,8 @@ class FleurDuMal(Poet):
         other_key = 12 if syllable_count == 10 else 10
         if len(self.couplets[other_key]):
             for other_couplet in self.couplets[other_key]:
-                if not self.rhyme_finder.is_rhyme(couplet[0].text, other_couplet[0].text):
+                if not rhyme.is_rhyme_signatures(
+                        couplet[0].rhyme_signature, other_couplet[0].rhyme_signature):
                     self.couplets[other_key].remove(other_couplet)
                     longer = couplet if syllable_count == 12 else other_couplet
                     shorter = couplet if syllable_count == 10 else other_couplet
@@ -371,6 +478,8 @@ class FleurDuMal(Poet):
 
 
 class Sonnetter(Poet):
+    uses_rhyme = True
+
     def __init__(self, **kwargs):
         super(Sonnetter, self).__init__(**kwargs)
         self.coupler = Coupler(10)
@@ -516,6 +625,10 @@ class MultiPoet(Poet):
         self._poem_type = "multipoet"
         self.lang = None
 
+    def prefetch(self, lines):
+        for p in self.poets:
+            p.prefetch(lines)
+
     def add_keyed_line(self, line, key=None):
         self.lines_seen += 1
         poems = [p.add_keyed_line(line, key) for p in self.poets]
@@ -0,0 +1,230 @@
+# coding: utf-8
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+import sqlite3
+import contextlib
+
+try:
+    if (sys.version_info > (3, 0)):
+        import dbm.gnu as dbm
+        DBM_V = 'dbm.gnu'
+    else:
+        import gdbm as dbm
+        DBM_V = 'gdbm'
+    DBM_FLAGS = 'cs'
+    # inside a session we sync explicitly, in batches
+    DBM_SESSION_FLAGS = 'c'
+except ImportError:
+    if (sys.version_info > (3, 0)):
+        import dbm
+        DBM_V = 'dbm'
+    else:
+        import anydbm as dbm
+        DBM_V = 'anydbm'
+    DBM_FLAGS = 'c'
+    DBM_SESSION_FLAGS = 'c'
+
+print('using %s for dbm' % DBM_V, file=sys.stderr)
+
+"""
+key/value stores for phoneme data. a store is an open handle on a file,
+with a small dict-like interface over byte strings:
+
+    store[key], store[key] = value, del store[key], key in store, len(store), store.keys(),
+    store.is_empty(), store.sync(), store.close()
+
+stores opened with session=True may buffer writes until sync().
+stores opened with new=True start out empty.
+reads and writes inside `with store.transaction():` are atomic, and written
+when the block ends. stores that are `shared` can be written by other
+processes while they're open, so anything read outside a transaction may
+already be stale.
+"""
+
+
+class DBMStore(object):
+
+    """the original store: a gdbm file (or whatever dbm is available)"""
+
+    extension = '.db'
+    # dbm takes a writer lock for as long as the file is open
+    shared = False
+
+    def __init__(self, path, session=False, new=False):
+        super(DBMStore, self).__init__()
+        flags = 'n' if new else DBM_SESSION_FLAGS if session else DBM_FLAGS
+        self._db = dbm.open(path, flags)
+
+    def __getitem__(self, key):
+        return self._db[key]
+
+    def __setitem__(self, key, value):
+        self._db[key] = value
+
+    def __delitem__(self, key):
+        del self._db[key]
+
+    def __contains__(self, key):
+        return key in self._db
+
+    def __len__(self):
+        return len(self._db)
+
+    def keys(self):
+        return self._db.keys()
+
+    def is_empty(self):
+        if hasattr(self._db, 'firstkey'):
+            return self._db.firstkey() is None
+        return len(self._db) == 0
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # nobody else can write while we have the file open
+        yield self
+
+    def sync(self):
+        if hasattr(self._db, 'sync'):
+            self._db.sync()
+
+    def close(self):
+        self._db.close()
+
+
+class SQLiteStore(object):
+
+    """
+    an sqlite store in WAL mode, so that several processes can share it:
+    any number of readers, and writers that take turns.
+    writes are buffered and committed in one transaction per sync();
+    outside of a session every write is committed immediately.
+    """
+
+    extension = '.sqlite'
+    shared = True
+
+    def __init__(self, path, session=False, new=False, timeout=30):
+        super(SQLiteStore, self).__init__()
+        self.session = session
+        self._pending = dict()
+        self._in_transaction = False
+        # we manage our own transactions
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, value BLOB NOT NULL)')
+        if new:
+            self._conn.execute('DELETE FROM entries')
+
+    def __getitem__(self, key):
+        if key in self._pending:
+            return self._pending[key]
+        row = self._conn.execute(
+            'SELECT value FROM entries WHERE key = ?', (sqlite3.Binary(key),)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return bytes(row[0])
+
+    def __setitem__(self, key, value):
+        self._pending[key] = value
+        if not self.session:
+            self.sync()
+
+    def __delitem__(self, key):
+        self.sync()
+        cursor = self._conn.execute('DELETE FROM entries WHERE key = ?', (sqlite3.Binary(key),))
+        if not cursor.rowcount:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._pending:
+            return True
+        return self._conn.execute(
+            'SELECT 1 FROM entries WHERE key = ?', (sqlite3.Binary(key),)).fetchone() is not None
+
+    def __len__(self):
+        self.sync()
+        return self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def keys(self):
+        self.sync()
+        return [bytes(row[0]) for row in self._conn.execute('SELECT key FROM entries')]
+
+    def is_empty(self):
+        if self._pending:
+            return False
+        return self._conn.execute('SELECT 1 FROM entries LIMIT 1').fetchone() is None
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        holds the write lock for the whole block, so that a value read
+        and written back can't be changed by another writer in between.
+        """
+        if self._in_transaction:
+            yield self
+            return
+        self.sync()
+        self._begin()
+        self._in_transaction = True
+        try:
+            yield self
+            self._write_pending()
+        except BaseException:
+            self._pending.clear()
+            self._conn.execute('ROLLBACK')
+            raise
+        finally:
+            self._in_transaction = False
+        self._conn.execute('COMMIT')
+
+    def _begin(self):
+        # IMMEDIATE takes the write lock up front, waiting up to timeout for other writers
+        self._conn.execute('BEGIN IMMEDIATE')
+
+    def _write_pending(self):
+        items = [(sqlite3.Binary(k), sqlite3.Binary(v)) for k, v in self._pending.items()]
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)', items)
+        self._pending.clear()
+
+    def sync(self):
+        if not self._pending:
+            return
+        if self._in_transaction:
+            # committed when the transaction ends
+            self._write_pending()
+            return
+        pending = dict(self._pending)
+        self._begin()
+        try:
+            self._write_pending()
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            # kept for the next sync
+            self._pending = pending
+            raise
+
+    def close(self):
+        self.sync()
+        self._conn.close()
+
+
+BACKENDS = {
+    'dbm': DBMStore,
+    'sqlite': SQLiteStore,
+}
+
+
+def get_backend(backend):
+    """backend can be a name in BACKENDS, or a store class"""
+    if isinstance(backend, type):
+        return backend
+    try:
+        return BACKENDS[backend]
+    except KeyError:
+        raise ValueError('unknown store backend %s' % backend)
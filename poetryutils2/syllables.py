@@ -1,11 +1,18 @@
 # coding: utf-8
 import re
+from array import array
 
 from . import utils
 from .special_syllables import special_syllables_en
 
 
-fallback_cache = dict()
+# permanent counts for words the rules get wrong
+special_cases = dict()
+
+# counts computed by the rules, for recently seen words
+SYLLABLE_CACHE_SIZE = 50000
+fallback_cache = utils.LRUCache(SYLLABLE_CACHE_SIZE)
+special_hits = 0
 
 fallback_subsyl = ["cial", "tia", "cius", "cious", "gui", "ion", "iou",
                    "sia$", ".ely$"]
@@ -27,45 +34,77 @@ for i in range(len(fallback_subsyl)):
 for i in range(len(fallback_addsyl)):
     fallback_addsyl[i] = re.compile(fallback_addsyl[i])
 
+# the same rules, split up so that for alphabetic words they can be checked
+# with string methods. the few rules that need real regexes are only run
+# when a cheap check says they might match.
+ADDSYL_SUBSTRINGS = ("ia", "riet", "dien", "iu", "io", "ii")
+ADDSYL_SUFFIXES = ("mbl", "ism", "dnt")
+ADDSYL_COA_PREFIXES = ("coad", "coag", "coal", "coax")
+SUBSYL_SUBSTRINGS = ("cial", "tia", "cius", "cious", "gui", "ion", "iou")
+
+VOWEL_GROUP_RE = re.compile(r'[aeiouy]+')
+TRIPLE_VOWEL_RE = fallback_addsyl[8]
+DOUBLE_VOWEL_L_RE = fallback_addsyl[11]
+LLIEN_RE = fallback_addsyl[12]
+GUA_RE = fallback_addsyl[17]
+
 
 def _normalize_word(word):
     return word.strip().lower()
 
-# Read our syllable override file and stash that info in the cache
+# Read our syllable override file
 for line in special_syllables_en:
     if line:
         toks = line.split()
         assert len(toks) == 2
-        fallback_cache[_normalize_word(toks[0])] = int(toks[1])
+        special_cases[_normalize_word(toks[0])] = int(toks[1])
+
+
+def set_cache_size(maxsize):
+    """resizes the cache of computed counts, dropping what's in it"""
+    global fallback_cache
+    fallback_cache = utils.LRUCache(maxsize)
 
 
-def count_syllables(sentance, debug=False, cutoff=None, lang='en'):
+def cache_stats():
+    """hit/miss/size counts for the computed count cache, and hits on special cases"""
+    stats = fallback_cache.stats()
+    stats['special_hits'] = special_hits
+    stats['special_size'] = len(special_cases)
+    return stats
+
+
+def count_syllables(sentance, debug=False, cutoff=None, lang='en', engine='heuristic'):
+    """
+    engine is 'heuristic', for the spelling rules, or 'phonemes', to count
+    vowel nuclei in each word's phonemes (see _phoneme_counts).
+    """
     # first lets strip out punctuation and emotive marks
     count = 0
 
     try:
-        sentance = _format_input(sentance)
+        words = utils.tokenize(sentance)
     except TypeError:
         # bad input
         return 0
 
     if debug:
         print('received sentance: %s' % sentance)
-        print('formatted sentance: %s' % sentance)
-
-    words = [w for w in sentance.split() if w.isalpha()]
-
-    if debug:
         print('extracted words: %s' % repr(words))
-        nonwords = [w for w in sentance.split() if not w.isalpha()]
-        if nonwords:
-            print('found nonwords: %s' % repr(words))
 
+    # the heuristic counts word by word, so that cutoff can stop it early;
+    # phonemes are worth resolving for the whole line at once
+    word_counts = None
+    if engine != 'heuristic':
+        word_counts = _word_counts(words, lang, engine)
     for w in words:
         # if is_camel(w):
         #     sylls = count_syllables(de_camel(w))
         # else:
-        sylls = _count(w)
+        if word_counts is None:
+            sylls = _count(w)
+        else:
+            sylls = word_counts[_normalize_word(w)]
 
         count += sylls
         if cutoff and count > cutoff:
@@ -80,6 +119,62 @@ def count_syllables(sentance, debug=False, cutoff=None, lang='en'):
     return count
 
 
+def count_syllables_many(lines, lang='en', engine='heuristic'):
+    """
+    syllable counts for a batch of lines, as an array of ints, the same as
+    count_syllables for each line. every distinct word in the batch is only
+    counted once. lines that aren't strings count as 0.
+    """
+    line_words = list()
+    counts = dict()
+    for line in lines:
+        try:
+            words = [_normalize_word(w) for w in utils.tokenize(line)]
+        except TypeError:
+            line_words.append(())
+            continue
+        for w in words:
+            counts[w] = None
+        line_words.append(words)
+
+    counts = _word_counts(counts, lang, engine)
+    return array('i', (sum(counts[w] for w in words) for words in line_words))
+
+
+def _word_counts(words, lang, engine):
+    """returns a dict of normalized word -> syllable count, for each distinct word"""
+    words = set(_normalize_word(w) for w in words)
+    if engine == 'heuristic':
+        return dict((w, _count(w)) for w in words)
+    if engine == 'phonemes':
+        return _phoneme_counts(words, lang)
+    raise ValueError('unknown syllable engine %s' % engine)
+
+
+def _phoneme_counts(words, lang):
+    """
+    counts the vowel nuclei in each word's phonemes. the phonemes are
+    resolved in one batch by the language's PhonemeRhymer, which stores
+    the count alongside them. special cases still win, and words without
+    any phonemes fall back to the heuristic.
+    """
+    # rhyme imports filters, which imports us
+    from . import rhyme
+    rhymer = rhyme.rhymer_for_language(lang)
+    counts = dict()
+    lookups = list()
+    for w in words:
+        if special_cases.get(w, -1) > 0:
+            counts[w] = _count(w)
+        else:
+            lookups.append(w)
+
+    rhymer.prefetch(lookups)
+    for w in lookups:
+        counts[w] = rhymer.get_entry(w).syllables or _count(w)
+    return counts
+
+
 # def _format_input(sentance):
     # """formatting for syllable counting"""
     # text = utils.fix_hashtags(sentance)
@@ -95,6 +190,7 @@ APOST_RE = re.compile(r'(\w)\'(\w)')
 PUNCT_RE = re.compile(r'[,#!;~\?\.\'\"\:\(\)\-\*]')
 
 
+# superseded by utils.tokenize, which gets the same words in one pass
 def _format_input(sentance):
     text = utils.fix_hashtags(sentance)
     text = re.sub(r'&', ' and ', text)  # handle ampersands
@@ -107,55 +203,96 @@ def _format_input(sentance):
 
 
 def _count(word, debug=False):
-    # global fallback_cache
+    global special_hits
 
     word = _normalize_word(word)
-    orig_word = word
 
     if not word:
         return 0
 
-    # Check for a cached syllable count
-    count = fallback_cache.get(orig_word, -1)
+    # Check for a known or cached syllable count
+    count = special_cases.get(word, -1)
     if count > 0:
+        special_hits += 1
         return count
+    count = fallback_cache.get(word, -1)
+    if count > 0:
+        return count
+
+    count = _compute_count(word)
+
+    # Cache the syllable count
+    fallback_cache.put(word, count)
+    return count
+
 
+def _compute_count(word, adjustment=None):
+    """the syllable count for a normalized word, without the cache"""
     # Remove final silent 'e'
     if word[-1] == "e":
         word = word[:-1]
 
     # Count vowel groups
-    count = 0
-    prev_was_vowel = 0
-    for c in word:
-        is_vowel = c in ("a", "e", "i", "o", "u", "y")
-        if is_vowel and not prev_was_vowel:
-            count += 1
-        prev_was_vowel = is_vowel
+    count = len(VOWEL_GROUP_RE.findall(word))
 
     # Add & subtract syllables
-    for r in fallback_addsyl:
-        if r.search(word):
-            count += 1
-    for r in fallback_subsyl:
-        if r.search(word):
-            count -= 1
-
-    # Cache the syllable count
+    if adjustment is None:
+        adjustment = _adjustment if word.isalpha() else _regex_adjustment
+    count += adjustment(word)
 
     if count == 0:
         count = 1
-
-    fallback_cache[orig_word] = count
     return count
 
+
+def _regex_adjustment(word):
+    """the net effect of the fallback_addsyl and fallback_subsyl rules on word"""
+    adjust = 0
+    for r in fallback_addsyl:
+        if r.search(word):
+            adjust += 1
+    for r in fallback_subsyl:
+        if r.search(word):
+            adjust -= 1
+    return adjust
+
+
+def _adjustment(word):
+    """
+    the same as _regex_adjustment, for alphabetic words only
+    (the rules' '.' and '$' treat newlines specially).
+    """
+    adjust = 0
+    for sub in ADDSYL_SUBSTRINGS:
+        if sub in word:
+            adjust += 1
+    for sub in SUBSYL_SUBSTRINGS:
+        if sub in word:
+            adjust -= 1
+
+    if word.endswith(ADDSYL_SUFFIXES):
+        adjust += 1
+    if word.startswith("mc"):
+        adjust += 1
+    if len(word) > 4 and word.startswith(ADDSYL_COA_PREFIXES):
+        adjust += 1
+    if len(word) > 2 and word.endswith("bl") and word[-3] in "aeiouy":
+        adjust += 1
+    if word.endswith("sia"):
+        adjust -= 1
+    if len(word) > 3 and word.endswith("ely"):
+        adjust -= 1
+
+    if TRIPLE_VOWEL_RE.search(word):
+        adjust += 1
+    if word.endswith("l") and DOUBLE_VOWEL_L_RE.search(word):
+        adjust += 1
+    if "llien" in word and LLIEN_RE.search(word):
+        adjust += 1
+    if "ua" in word and GUA_RE.search(word):
+        adjust += 1
+    return adjust
+
 #
-# Phoneme-driven syllable counting
+# Phoneme-driven syllable counting: see _phoneme_counts and rhyme.count_nuclei
 #
-
-# def count_decomp(decomp):
-#     count = 0
-#     for unit in decomp:
-#         if gnoetics.phoneme.is_xstressed(unit):
-#             count += 1
-#     return count
@@ -5,6 +5,8 @@ import sys
 import os
 import re
 import time
+import itertools
+from collections import OrderedDict
 
 
 MODULE_PATH = os.path.dirname(os.path.realpath(__file__))
@@ -60,6 +62,153 @@ def fix_hashtags(text):
         text = re.sub(h, fix, text, count=1)
     return text
 
+
+HASHTAG_SEGMENT_RE = re.compile(r'[A-Z][a-z]+')
+LINK_RE = re.compile(r'http://[a-zA-Z0-9\./]*\w')
+WORD_CHAR_RE = re.compile(r'\w')
+
+# letters and punctuation, which covers most text. an 'h' is left out if it starts a link.
+PLAIN = r"""
+    [a-gi-zA-Z\ ,!;~\?\.\"\:\(\)\-\*] | h(?!ttp://[a-zA-Z0-9\./]*\w)
+"""
+# an apostrophe that certainly joins two letters (see tokenize)
+JOINING_APOSTROPHE = r"""
+    [a-zA-Z](?<!'[a-zA-Z])'(?=[a-zA-Z](?!')(?!ttp://[a-zA-Z0-9\./]*\w))
+"""
+# text that's nothing but these can be tokenized with a findall
+PLAIN_TEXT_RE = re.compile(r"(?:%s|%s)*\Z" % (PLAIN, JOINING_APOSTROPHE), re.VERBOSE)
+
+# the tokens tokenize cares about. everything in 'other' is dropped,
+# joining whatever is on either side of it.
+TOKEN_RE = re.compile(r"""
+    (?P<hashtag>\#(?:[A-Z][a-z]+)+)
+  | (?P<link>http://[a-zA-Z0-9\./]*\w)
+  | (?P<plain>(?:%s)+)
+  | (?P<amp>&)
+  | (?P<apostrophe>')
+  | (?P<hash>\#)
+  | (?P<other>[^a-zA-Z\ ,!;~\?\.\"\:\(\)\-\*\#&']+)
+""" % PLAIN, re.VERBOSE)
+PUNCTUATION_RE = re.compile(r'[\ ,!;~\?\.\"\:\(\)\-\*]+')
+LETTERS_RE = re.compile(r'[a-zA-Z]+')
+
+
+def tokenize(text):
+    """
+    the words of text, for syllable counting, in a single pass: the same
+    words as syllables._format_input(text).split(). hashtags are split into
+    words, '&' is 'and', a link is 'link', apostrophes between word characters
+    are dropped ("isn't" is 'isnt'), punctuation separates words, and any
+    other non-letters are dropped.
+    """
+    if not isstring(text):
+        raise TypeError('expected a string, got %s' % type(text))
+    if PLAIN_TEXT_RE.match(text):
+        return LETTERS_RE.findall(text.replace("'", ''))
+
+    words = list()
+    word = ''
+    # whether the last character could start an apostrophe join, and
+    # whether the last token was an apostrophe that joined two words
+    prev_joinable = False
+    joined = False
+    pos = 0
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        kind, token = match.lastgroup, match.group()
+        pos = match.end()
+
+        if kind == 'plain':
+            parts = PUNCTUATION_RE.split(token)
+            word += parts[0]
+            if len(parts) > 1:
+                if word:
+                    words.append(word)
+                words.extend(p for p in parts[1:-1] if p)
+                word = parts[-1]
+            # a character joined by an apostrophe can't start another join
+            prev_joinable = bool(parts[-1]) and not (joined and len(token) == 1)
+            joined = False
+            continue
+
+        if kind == 'other':
+            prev_joinable = (bool(WORD_CHAR_RE.match(token[-1])) and
+                             not (joined and len(token) == 1))
+            joined = False
+            continue
+
+        if kind == 'apostrophe':
+            nxt = text[pos:pos + 1]
+            if (prev_joinable and nxt and WORD_CHAR_RE.match(nxt) and
+                    not (nxt == 'h' and LINK_RE.match(text, pos))):
+                prev_joinable = False
+                joined = True
+                continue
+
+        if word:
+            words.append(word)
+        word = ''
+        prev_joinable = joined = False
+
+        if kind == 'hashtag':
+            segments = [s.lower() for s in HASHTAG_SEGMENT_RE.findall(token)]
+            words.extend(segments[:-1])
+            word = segments[-1]
+            prev_joinable = True
+            if word.endswith('http') and text.startswith('://', pos):
+                # the fixed hashtag can run into a link
+                link = LINK_RE.match('http' + text[pos:])
+                if link:
+                    if word[:-4]:
+                        words.append(word[:-4])
+                    words.append('link')
+                    word = ''
+                    prev_joinable = False
+                    pos += link.end() - 4
+        elif kind == 'link':
+            words.append('link')
+        elif kind == 'amp':
+            words.append('and')
+
+    if word:
+        words.append(word)
+    return words
+
+
+SPLIT_RE = re.compile(r'(?P<hashtag>#(?:[A-Z][a-z]+)+)|(?P<run>[^\s#,\.\?\!]+)', re.UNICODE)
+
+
+def split_words(text):
+    """
+    the words of fix_hashtags(text), split on whitespace and '#,.?!', in a single pass.
+    unlike tokenize, words keep their apostrophes, digits and accents.
+    """
+    if not isstring(text):
+        raise TypeError('expected a string, got %s' % type(text))
+
+    words = list()
+    word = ''
+    end = None
+    for match in SPLIT_RE.finditer(text):
+        if match.lastgroup == 'run' and match.start() == end:
+            # continuing the last word of a hashtag
+            word += match.group()
+            continue
+        if word:
+            words.append(word)
+        word = ''
+        if match.lastgroup == 'hashtag':
+            segments = [s.lower() for s in HASHTAG_SEGMENT_RE.findall(match.group())]
+            words.extend(segments[:-1])
+            word = segments[-1]
+            end = match.end()
+        else:
+            word = match.group()
+            end = None
+    if word:
+        words.append(word)
+    return words
+
 # def sub_non_latin_chars(text):
 #     return re.sub(ur'[\u00FF-\u024F]', '', text)
 
@@ -110,6 +259,38 @@ def synonyms(word):
     return syns
 
 
+def _wordlist_path(filename):
+    """a wordlist in resources, or else the copy shipped with the package"""
+    filepath = os.path.join(RESOURCES_DIR, filename)
+    if not os.path.exists(filepath):
+        filepath = os.path.join(MODULE_PATH, filename)
+    return filepath
+
+
+def wordlist_stamp(lang):
+    """
+    identifies the wordlist load_words returns for lang, by the size and
+    modification time of the files it is read from, without reading them.
+    """
+    paths = [_wordlist_path('words.txt' if lang == 'en' else 'mots_fr.txt')]
+    if lang == 'en':
+        try:
+            import nltk
+            paths.extend(nltk.corpus.words.abspaths())
+        except (ImportError, LookupError):
+            pass
+    parts = list()
+    for path in paths:
+        path = unicodify(str(path))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            parts.append('%s:missing' % path)
+        else:
+            parts.append('%s:%d:%d' % (path, stat.st_size, int(stat.st_mtime)))
+    return '|'.join(parts)
+
+
 def wordlist_en():
     words = set()
     try:
@@ -118,7 +299,7 @@ def wordlist_en():
             unicodify(w).lower().strip() for w in nltk.corpus.words.words())
     except ImportError:
         print('failed to import nltk, using shorter english wordlist', file=sys.stderr)
-    filepath = os.path.join(RESOURCES_DIR, 'words.txt')
+    filepath = _wordlist_path('words.txt')
     with open(filepath) as f:
         words.update(
             unicodify(l).lower().strip() for l in f.read().splitlines())
@@ -129,7 +310,7 @@ def wordlist_en():
 
 def wordlist_fr():
     words = set()
-    filepath = os.path.join(RESOURCES_DIR, 'mots_fr.txt')
+    filepath = _wordlist_path('mots_fr.txt')
     with open(filepath) as f:
         words.update(
             unicodify(l).lower().strip() for l in f.read().splitlines())
@@ -153,6 +334,110 @@ def is_real_word(word, lang='en'):
     return word in wordlist
 
 
+class LRUCache(object):
+
+    """
+    a size-capped mapping that evicts its least recently used entries.
+    keeps hit/miss/eviction counts, so we can see how well it's doing.
+    """
+
+    def __init__(self, maxsize=10000):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if not self.maxsize:
+            return
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0
+        }
+
+
+class BoundedCounter(object):
+
+    """
+    counts items in bounded memory, in the manner of space-saving. once more
+    than twice capacity items are tracked, all but the capacity most common
+    are dropped, and `error` is the highest count dropped so far. items that
+    aren't tracked start from `error`, so a tracked item's count is never
+    below its true count, and over it by at most `error`; an item that isn't
+    tracked has been seen at most `error` times.
+    """
+
+    def __init__(self, capacity=100000):
+        super(BoundedCounter, self).__init__()
+        self.capacity = capacity
+        self.total = 0
+        self.error = 0
+        self._counts = dict()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __contains__(self, item):
+        return item in self._counts
+
+    def __getitem__(self, item):
+        return self._counts.get(item, 0)
+
+    def add(self, item, count=1):
+        self.total += count
+        self._counts[item] = self._counts.get(item, self.error) + count
+        if len(self._counts) > 2 * self.capacity:
+            self._prune()
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def _prune(self):
+        ranked = self.most_common()
+        for item, count in ranked[self.capacity:]:
+            del self._counts[item]
+        self.error = max(self.error, ranked[self.capacity][1])
+
+    def most_common(self, n=None):
+        """returns (item, count) tuples, most common first"""
+        ranked = sorted(self._counts.items(), key=lambda x: x[1], reverse=True)
+        return ranked[:n] if n is not None else ranked
+
+
 def lines_from_file(filepath):
     lines = None
     with open(filepath) as f:
@@ -168,7 +453,7 @@ def debug_lines():
 # these, at some point, might want to be in another file:
 
 
-def line_iter(source, filters, key=None, delay=0):
+def line_iter(source, filters, key=None, delay=0, chunk_size=None):
     """
     takes a source iterator and a list of filters
     yields items from source that pass filters.
@@ -179,19 +464,39 @@ def line_iter(source, filters, key=None, delay=0):
 
     for tweets where we want to preserve metadata,
     we would pass key='text', e.g.
+
+    if chunk_size is set, source is read chunk_size items at a time,
+    and each chunk is filtered with filter_lines.
     """
 
-    for item in source:
-        if isinstance(item, basestring):
-            line = unicodify(item)
-        else:
-            assert key is not None, 'non-string sources require a key'
-            line = unicodify(item[key])
+    if chunk_size:
+        passed = _filtered_chunks(source, filters, key, chunk_size)
+    else:
+        passed = (item for item in source if filter_line(_item_line(item, key), filters))
+
+    for item in passed:
+        yield item
+        if delay:
+            time.sleep(delay)
+
+
+def _filtered_chunks(source, filters, key, chunk_size):
+    source = iter(source)
+    while True:
+        chunk = list(itertools.islice(source, chunk_size))
+        if not chunk:
+            return
+        results = filter_lines([_item_line(item, key) for item in chunk], filters)
+        for item, passed in zip(chunk, results):
+            if passed:
+                yield item
 
-        if filter_line(line, filters):
-            yield item
-            if delay:
-                time.sleep(delay)
+
+def _item_line(item, key):
+    if isstring(item):
+        return unicodify(item)
+    assert key is not None, 'non-string sources require a key'
+    return unicodify(item[key])
 
 
 def unicodify(item):
@@ -214,6 +519,27 @@ def filter_line(line, filters):
     return all(f(line) for f in filters)
 
 
+def filter_lines(lines, filters):
+    """
+    filter_line for a batch of lines, returning a list of bools.
+    filters with a batch attribute check all of the lines still passing in one call.
+    """
+    passed = [True] * len(lines)
+    for f in filters:
+        idxs = [i for i, p in enumerate(passed) if p]
+        if not idxs:
+            break
+        batch = getattr(f, 'batch', None)
+        if batch:
+            results = batch([lines[i] for i in idxs])
+        else:
+            results = [f(lines[i]) for i in idxs]
+        for i, result in zip(idxs, results):
+            if not result:
+                passed[i] = False
+    return passed
+
+
 def main():
     pass
 
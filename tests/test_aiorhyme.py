@@ -0,0 +1,105 @@
+# coding: utf-8
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import io
+import sys
+import asyncio
+
+from poetryutils2 import aiorhyme, espeak_wrapper, rhyme
+
+
+def test_async_rhymes():
+    try:
+        test_db_path = 'test_async_db.tmp'
+        rhymer = aiorhyme.AsyncPhonemeRhymer(rhyme.PhonemeRhymer('.', 'en', test_db_path))
+
+        async def run():
+            entries = await asyncio.gather(*[rhymer.aget_entry('hello') for _ in range(5)])
+            assert all(e.phonemes == 'həlˈoʊ' for e in entries)
+            assert rhymer.coalesced == 4
+            assert await rhymer.ais_rhyme('hi', 'bye')
+            assert not await rhymer.ais_rhyme('hi', 'hello')
+            await rhymer.aclose()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+        loop.close()
+        assert len(rhymer.rhymer) == 3
+    finally:
+        os.remove(test_db_path)
+        os.remove(rhymer.rhymer.indexpath)
+        os.remove(rhymer.rhymer.unresolvedpath)
+
+
+def test_async_lexicon():
+    try:
+        lexicon_path = 'test_async_lexicon.tmp'
+        test_db_path = 'test_async_lexicon_db.tmp'
+        with io.open(lexicon_path, 'w') as f:
+            f.write('HAPPY  HH AE1 P IY0\n')
+        rhymer = aiorhyme.AsyncPhonemeRhymer(
+            rhyme.PhonemeRhymer('.', 'en', test_db_path, lexicon_path=lexicon_path))
+
+        async def run():
+            assert await rhymer.aget_phonemes('happy') == 'hˈæpi'
+            await rhymer.aclose()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+        loop.close()
+        assert rhymer.rhymer.lexicon_hits == 1
+    finally:
+        os.remove(lexicon_path)
+        os.remove(test_db_path)
+        os.remove(rhymer.rhymer.indexpath)
+        os.remove(rhymer.rhymer.unresolvedpath)
+
+
+def test_async_espeak_retries():
+    espeak_wrapper.stats.reset()
+    loop = asyncio.new_event_loop()
+    # every attempt times out: we get no phonemes, rather than an error
+    phonemes = loop.run_until_complete(
+        aiorhyme.extract_phonemes_async('hi', timeout=0, retries=1, backoff=0))
+    loop.close()
+    assert phonemes == ''
+    stats = espeak_wrapper.stats.as_dict()
+    assert stats['timeouts'] == 2
+    assert stats['retries'] == 1
+
+
+def test_async_espeak_cancelled():
+    procs = list()
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def tracked(*args, **kwargs):
+        proc = await create_subprocess_exec(*args, **kwargs)
+        procs.append(proc)
+        return proc
+
+    async def run():
+        # an espeak that hangs
+        task = asyncio.ensure_future(
+            aiorhyme.run_espeak_async(['-c', 'import time; time.sleep(30)']))
+        while not procs:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    command = espeak_wrapper._get_espeak_command()
+    espeak_wrapper._get_espeak_command.ESPEAK_COMMAND_NAME = sys.executable
+    asyncio.create_subprocess_exec = tracked
+    try:
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+        loop.close()
+    finally:
+        asyncio.create_subprocess_exec = create_subprocess_exec
+        espeak_wrapper._get_espeak_command.ESPEAK_COMMAND_NAME = command
+    # the cancelled caller didn't leave espeak running
+    assert procs[0].returncode is not None
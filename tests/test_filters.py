@@ -119,3 +119,11 @@ def test_real_word_ratio():
     assert not filters.real_word_ratio_filter(0.7, 'en', True)(words)
     assert filters.real_word_ratio_filter(0.5, 'fr', True)(words_fr)
     assert not filters.real_word_ratio_filter(0.7, 'fr', True)(words_fr)
+
+
+def test_syllable_count_batch():
+    lines = ['my day is coming', 'or are you a bro', 'hi', "it's a #PracticeDay", "it's a day"]
+    f = filters.syllable_count_filter('5')
+    assert f.batch(lines) == [f(l) for l in lines]
+    assert utils.filter_lines(lines, [f, filters.line_length_filter('2-20')]) == [
+        False, False, True, False, True]
@@ -0,0 +1,44 @@
+# coding: utf-8
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import io
+
+from poetryutils2 import lexicon, rhyme
+
+LEXICON = """;;; a tiny cmudict
+HELLO  HH AH0 L OW1
+HELLO(2)  HH EH0 L OW1
+HAPPY  HH AE1 P IY0
+NATION  N EY1 SH AH0 N
+FORT  F AO1 R T
+"""
+
+
+def test_arpabet_to_ipa():
+    assert lexicon.arpabet_to_ipa('HH AH0 L OW1'.split()) == 'həlˈoʊ'
+    assert lexicon.arpabet_to_ipa('HH AE1 P IY0'.split()) == 'hˈæpi'
+    assert lexicon.arpabet_to_ipa('N EY1 SH AH0 N'.split()) == 'nˈeɪʃən'
+
+
+def test_lexicon_rhymer():
+    try:
+        lexicon_path = 'test_lexicon.tmp'
+        test_db_path = 'test_lexicon_db.tmp'
+        with io.open(lexicon_path, 'w') as f:
+            f.write(LEXICON)
+        words = lexicon.load_lexicon(lexicon_path)
+        assert len(words) == 4
+        assert words['hello'] == 'həlˈoʊ'
+
+        rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path, lexicon_path=lexicon_path)
+        assert rhymer.get_entry('fort') == rhyme.PhonemeEntry('fˈöɹt', 'öɹt', ('öɹt', 'föɹt', 'föɹt'), 1)
+        assert rhymer.prefetch(['nation', 'happy', 'hello']) == 3
+        assert rhymer.lexicon_hits == 4
+        assert rhymer.get_phonemes('nation') == 'nˈeɪʃən'
+    finally:
+        os.remove(lexicon_path)
+        os.remove(test_db_path)
+        os.remove(rhymer.indexpath)
+        os.remove(rhymer.unresolvedpath)
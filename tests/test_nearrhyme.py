@@ -0,0 +1,46 @@
+# coding: utf-8
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+
+from poetryutils2 import nearrhyme, rhyme, sorting
+
+
+def test_end_sound_space():
+    vector, length = nearrhyme.encode_sound('ˈaɪm')
+    assert length == 3
+    assert not vector[:-3].any()
+    space = nearrhyme.EndSoundSpace(capacity=2)
+    for sound in ('aɪm', 'aɪn', 'oʊ', 'ɪŋ'):
+        space.add(sound)
+    assert len(space) == 4
+    assert space.nearest('aɪm', 0.1) == ('aɪm', 0.0)
+    assert space.nearest('ɪn', 0.1)[0] == 'ɪŋ'
+    assert space.nearest('uː', 0.1) is None
+
+
+def test_near_rhymes():
+    try:
+        test_db_path = 'test_near_db.tmp'
+        rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path)
+        with rhymer:
+            rhymer.prefetch(['time', 'mine', 'hi', 'nation', 'dumb'])
+        assert rhymer.near_rhymes('time') == ['mine']
+        assert rhymer.near_rhymes('time', threshold=0) == []
+        # words stored later are picked up, with new end sounds or known ones
+        with rhymer:
+            rhymer.prefetch(['station', 'fort', 'port'])
+        assert rhymer.near_rhymes('nation')[0] == 'station'
+        assert rhymer.near_rhymes('fort')[0] == 'port'
+    finally:
+        os.remove(test_db_path)
+        os.remove(rhymer.indexpath)
+        os.remove(rhymer.unresolvedpath)
+
+
+def test_loose_rhymer():
+    lines = ['what a time', 'that one is mine']
+    assert not list(sorting.Rhymer().generate_from_source(lines))
+    poems = list(sorting.Rhymer(loose=True).generate_from_source(lines))
+    assert len(poems) == 1
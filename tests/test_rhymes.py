@@ -3,8 +3,9 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
+import contextlib
 
-from poetryutils2 import rhyme, espeak_wrapper
+from poetryutils2 import rhyme, espeak_wrapper, stores, utils
 
 
 rhymer_en = rhyme.rhymer_for_language('en', debug=True)
@@ -21,6 +22,13 @@ def test_get_phonemes():
     assert rhymer_en.get_phonemes('hello') == 'həlˈoʊ'
 
 
+def test_phoneme_cache():
+    rhymer_en.get_phonemes('hello')
+    hits = rhymer_en.cache.hits
+    assert rhymer_en.get_phonemes('hello') == 'həlˈoʊ'
+    assert rhymer_en.cache.hits == hits + 1
+
+
 def test_get_phonemes_fr():
     assert rhymer_fr
     rhymer_fr.get_phonemes('français') == "fʁɑ̃sˈɛ"
@@ -115,3 +123,288 @@ def test_add_words():
         assert len(rhymer) == 3
     finally:
         os.remove(test_db_path)
+        os.remove(rhymer.indexpath)
+        os.remove(rhymer.unresolvedpath)
+
+
+def test_add_words_resumes():
+    try:
+        test_db_path = 'test_add_db.tmp'
+        rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path)
+        words = ['hi', 'bye', 'Hi', 'dumb', 'zzxq', 'sigh', 'cry', 'hello']
+        assert rhymer.add_new_words(words[:4], workers=2, chunksize=1, batch_size=2) == 3
+        # zzxq has no usable phonemes, so it goes to the negative cache.
+        # the stub is in place before the worker pool is forked
+        with _espeak_without(['zzxq']):
+            assert rhymer.add_new_words(words, workers=2, chunksize=2, batch_size=2) == 3
+        assert rhymer.unresolved_added == 1
+        assert len(rhymer) == 6
+        assert rhymer.add_new_words(words) == 0
+        assert rhymer.get_phonemes('hello') == 'həlˈoʊ'
+    finally:
+        os.remove(test_db_path)
+        os.remove(rhymer.indexpath)
+        os.remove(rhymer.unresolvedpath)
+
+
+def test_session():
+    try:
+        test_db_path = 'test_session_db.tmp'
+        rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path)
+        with rhymer:
+            assert rhymer.in_session
+            assert rhymer.db is not None
+            db = rhymer.db
+            assert len(rhymer) == 0
+            # the handle is reused across calls
+            assert rhymer.db is db
+        assert not rhymer.in_session
+        assert rhymer.db is None
+    finally:
+        os.remove(test_db_path)
+
+
+def test_espeak_pool():
+    words = ['hello', 'hi', 'bye', 'hello']
+    with espeak_wrapper.EspeakPool('en', batch_size=2) as pool:
+        results = pool.extract(words)
+    assert len(results) == 3
+    assert results['hello'] == 'həlˈoʊ'
+    assert results['hi'] == espeak_wrapper.extract_phonemes('hi')[1]
+
+
+def test_espeak_stats():
+    espeak_wrapper.stats.reset()
+    assert espeak_wrapper.extract_phonemes('hi') == ('hi', 'hˈaɪ')
+    # every attempt times out
+    assert espeak_wrapper.extract_phonemes('hi', timeout=0, retries=1, backoff=0) == ('hi', '')
+    stats = espeak_wrapper.stats.as_dict()
+    assert stats['calls'] == 3
+    assert stats['failures'] == 2
+    assert stats['timeouts'] == 2
+    assert stats['retries'] == 1
+    assert stats['mean_latency'] > 0
+
+
+def test_prefetch():
+    try:
+        test_db_path = 'test_prefetch_db.tmp'
+        rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path)
+        assert rhymer.prefetch(['hi', 'bye', 'Hi', 'dumb']) == 3
+        assert len(rhymer) == 3
+        assert rhymer.prefetch(['hi', 'bye']) == 0
+        misses = rhymer.cache.misses
+        assert rhymer.get_phonemes('dumb') == espeak_wrapper.extract_phonemes('dumb')[1]
+        assert rhymer.cache.misses == misses
+    finally:
+        os.remove(test_db_path)
+        os.remove(rhymer.indexpath)
+        os.remove(rhymer.unresolvedpath)
+
+
+def test_entries():
+    entry = rhymer_en.get_entry('hello')
+    assert entry.phonemes == 'həlˈoʊ'
+    assert entry.end_sound == 'oʊ'
+    assert rhymer_en.sound_for_word('hello') == 'oʊ'
+
+
+def _make_legacy_db(path, entries):
+    db = stores.dbm.open(path, 'c')
+    for word, phonemes in entries:
+        db[word.encode('utf-8')] = phonemes.encode('utf-8')
+    db.close()
+
+
+def test_upgrade_legacy_entries():
+    try:
+        test_db_path = 'test_upgrade_db.tmp'
+        _make_legacy_db(test_db_path, [('fort', 'fˈɔːɹt'), ('port', 'pˈöɹt')])
+        rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path)
+        # legacy entries are upgraded as they're read
+        assert rhymer.get_entry('port') == rhyme.PhonemeEntry('pˈöɹt', 'öɹt', ('öɹt', 'pöɹt', 'pöɹt'), 1)
+        assert not rhymer._schema_current
+        assert rhymer.upgrade_db() == 1
+        assert rhymer.upgrade_db() == 0
+        assert rhymer._schema_current
+        assert len(rhymer) == 2
+
+        rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path)
+        assert rhymer.get_entry('fort') == rhyme.PhonemeEntry('fˈöɹt', 'öɹt', ('öɹt', 'föɹt', 'föɹt'), 1)
+        assert rhymer._schema_current
+    finally:
+        os.remove(test_db_path)
+        os.remove(rhymer.indexpath)
+
+
+def test_new_db_is_current():
+    try:
+        test_db_path = 'test_schema_db.tmp'
+        rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path)
+        assert len(rhymer) == 0
+        assert rhymer._schema_current
+    finally:
+        os.remove(test_db_path)
+
+
+class CountingStore(stores.DBMStore):
+    opened = 0
+
+    def __init__(self, *args, **kwargs):
+        super(CountingStore, self).__init__(*args, **kwargs)
+        CountingStore.opened += 1
+
+
+def test_rhymes_for_word():
+    try:
+        test_db_path = 'test_index_db.tmp'
+        rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path, backend=CountingStore)
+        with rhymer:
+            rhymer.prefetch(['hi', 'bye', 'sigh', 'cry', 'dumb'])
+        rhymer.cache.clear()
+        rhymer.signatures.clear()
+        opened = CountingStore.opened
+        assert sorted(rhymer.rhymes_for_word('hi')) == ['bye', 'cry', 'sigh']
+        # the word's own lookup, the index, and one read for all the candidates
+        assert CountingStore.opened - opened == 3
+        assert len(rhymer.rhymes_for_word('bye', limit=2)) == 2
+        rhymer.rebuild_rhyme_index()
+        assert sorted(rhymer.rhymes_for_word('sigh')) == ['bye', 'cry', 'hi']
+        assert rhymer.rhymes_for_word('dumb') == []
+    finally:
+        os.remove(test_db_path)
+        os.remove(rhymer.indexpath)
+        os.remove(rhymer.unresolvedpath)
+
+
+@contextlib.contextmanager
+def _espeak_without(junk):
+    """
+    espeak as usual, except that it has no phonemes for the words in junk.
+    what espeak can't phonemize varies by version, so tests choose their own.
+    """
+    extract_phonemes = espeak_wrapper.extract_phonemes
+    pool_extract = espeak_wrapper.EspeakPool.extract
+
+    def stub_extract_phonemes(word, *args, **kwargs):
+        if word in junk:
+            return word, ''
+        return extract_phonemes(word, *args, **kwargs)
+
+    def stub_pool_extract(pool, words):
+        results = pool_extract(pool, [w for w in words if w not in junk])
+        results.update((w, '') for w in words if w in junk)
+        return results
+
+    espeak_wrapper.extract_phonemes = stub_extract_phonemes
+    espeak_wrapper.EspeakPool.extract = stub_pool_extract
+    try:
+        yield
+    finally:
+        espeak_wrapper.extract_phonemes = extract_phonemes
+        espeak_wrapper.EspeakPool.extract = pool_extract
+
+
+def test_unresolved_words():
+    try:
+        test_db_path = 'test_unresolved_db.tmp'
+        with _espeak_without(['zzxq', 'qq', 'xx', 'zz', 'xq']):
+            rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path)
+            assert rhymer.prefetch(['hi', 'zzxq']) == 2
+            # junk words stay out of the db
+            assert len(rhymer) == 1
+            assert rhymer.get_phonemes('zzxq') == ''
+
+            rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path)
+            assert rhymer.get_phonemes('zzxq') == ''
+            assert rhymer.sound_for_word('zzxq') is None
+            assert rhymer.unresolved_hits == 1
+
+            rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path, unresolved_ttl=-1)
+            assert rhymer.get_phonemes('zzxq') == ''
+            assert rhymer.unresolved_hits == 0
+
+            rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path, unresolved_max=2)
+            rhymer.prefetch(['qq', 'xx', 'zz', 'xq'])
+            with rhymer._open_unresolved() as store:
+                assert len(store) <= 2
+    finally:
+        os.remove(test_db_path)
+        os.remove(rhymer.indexpath)
+        os.remove(rhymer.unresolvedpath)
+
+
+def test_rhyme_signatures():
+    sig = rhymer_en.signature('Hi')
+    assert sig == rhyme.RhymeSignature('hi', 'hˈaɪ', 'aɪ', True, ('aɪ', 'haɪ', 'haɪ'))
+    assert rhymer_en.signature('hi') is sig
+    pairs = [('hi', 'bye'), ('hi', 'hello'), ('sea', 'see'), ('fort', 'port')]
+    for w1, w2 in pairs:
+        sigs = rhymer_en.signature(w1), rhymer_en.signature(w2)
+        assert rhyme.is_rhyme_signatures(*sigs) == rhymer_en.is_rhyme(w1, w2)
+
+
+def test_group_by_rhyme():
+    lines = ['say hi', 'bye!', 'I sigh', 'I see', 'the sea', 'me', 'dumb', 'hello', '']
+    groups = rhymer_en.group_by_rhyme(lines)
+    assert len(groups) == 2
+    assert sorted(sorted(h) for h in groups[0]) == [['I sigh'], ['bye!'], ['say hi']]
+    assert sorted(sorted(h) for h in groups[1]) == [['I see', 'the sea'], ['me']]
+
+    items = [{'text': l} for l in lines]
+    groups = rhymer_en.group_by_rhyme(items, key='text', min_group=3)
+    assert len(groups) == 1
+    assert rhymer_en._homophone_key('ɡʊdbˈaɪ', {'bˈaɪ': [], 'ɡʊdbˈaɪ': []}) == 'bˈaɪ'
+
+
+def test_normalize_word():
+    try:
+        table_path = 'test_doubled_endings.tmp'
+        words = set(['hello', 'home', 'melee', 'as', 'ass'])
+        assert rhyme.build_doubled_endings(table_path, words=words) == 2
+        rhymer = rhyme.PhonemeRhymer('.', 'en', doubled_endings_path=table_path)
+        assert rhymer._normalize_word('hellooooo') == 'hello'
+        assert rhymer._normalize_word('homee') == 'home'
+        assert rhymer._normalize_word('melee') == 'melee'
+        assert rhymer._normalize_word('asssss') == 'ass'
+        assert rhymer._normalize_word('mattt') == 'mat'
+        assert rhymer._normalize_word('Haahhhh') == 'haah'
+        hits = rhymer.normalized.hits
+        assert rhymer._normalize_word('hellooooo') == 'hello'
+        assert rhymer.normalized.hits == hits + 1
+        rhymer.doubled_endings.close()
+    finally:
+        os.remove(table_path)
+
+
+def test_doubled_endings_rebuilt():
+    try:
+        test_db_path = 'test_doubled_db.tmp'
+        rhymer = rhyme.PhonemeRhymer('.', 'en', test_db_path)
+        # a table that wasn't built from the current wordlist
+        rhyme.build_doubled_endings(rhymer.doubled_endings_path, words=set(['zebrao']))
+        assert rhymer._normalize_word('zebraooo') == 'zebraoo'
+        stamp = rhymer.doubled_endings.get(rhyme.DOUBLED_ENDINGS_STAMP_KEY)
+        assert stamp.decode('utf-8') == utils.wordlist_stamp('en')
+        rhymer.doubled_endings.close()
+    finally:
+        os.remove(rhymer.doubled_endings_path)
+
+
+def test_rhyme_depth():
+    entry = rhymer_en.get_entry('nation')
+    assert entry.rhyme_keys == ('ən', 'eɪʃən', 'neɪʃən')
+    assert rhymer_en.is_rhyme('nation', 'ocean')
+    assert not rhymer_en.is_rhyme('nation', 'ocean', depth=2)
+    assert rhymer_en.is_rhyme('nation', 'station', depth=2)
+    assert rhymer_en.sound_for_word('station', depth=2) == 'eɪʃən'
+
+
+def test_count_nuclei():
+    assert rhyme.count_nuclei('nˈeɪʃən') == 2
+    assert rhyme.count_nuclei('kɹˈaɪɪŋ') == 2
+    assert rhyme.count_nuclei('ɹiˈækʃən') == 3
+    assert rhyme.count_nuclei('bˈʌʔn̩') == 2
+    assert rhyme.count_nuclei('hˈɜːt') == 1
+    assert rhyme.count_nuclei('') == 0
+    assert rhymer_en.get_entry('station').syllables == 2
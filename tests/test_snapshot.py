@@ -0,0 +1,52 @@
+# coding: utf-8
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+
+from poetryutils2 import snapshot, rhyme, stores
+
+
+def test_snapshot_roundtrip():
+    try:
+        path = 'test_snapshot.tmp'
+        items = [('word%d' % i, 'value\t%d' % i) for i in range(100)]
+        items = [(k.encode('utf-8'), v.encode('utf-8')) for k, v in items]
+        assert snapshot.write_snapshot(path, items) == 100
+        snap = snapshot.PhonemeSnapshot(path)
+        assert len(snap) == 100
+        for key, value in items:
+            assert snap[key] == value
+        assert b'word100' not in snap
+        assert snap.get(b'aaa') is None
+        assert snap.get(b'zzz') is None
+        snap.close()
+    finally:
+        os.remove(path)
+
+
+def test_rhymer_snapshot():
+    try:
+        db_path = 'test_snapshot_db.tmp'
+        snapshot_path = 'test_snapshot_phonemes.tmp'
+        db = stores.dbm.open(db_path, 'c')
+        db['fort'.encode('utf-8')] = 'fˈɔːɹt'.encode('utf-8')
+        db.close()
+        rhymer = rhyme.PhonemeRhymer('.', 'en', db_path)
+        index_path, unresolved_path = rhymer.indexpath, rhymer.unresolvedpath
+        rhymer.get_entry('hello')
+        assert rhymer.export_snapshot(snapshot_path) == 2
+
+        os.remove(db_path)
+
+        reader = rhyme.PhonemeRhymer('.', 'en', db_path, snapshot_path=snapshot_path)
+        assert reader.get_entry('fort') == rhyme.PhonemeEntry('fˈöɹt', 'öɹt', ('öɹt', 'föɹt', 'föɹt'), 1)
+        assert reader.get_phonemes('hello') == 'həlˈoʊ'
+        # both were served from the snapshot
+        assert len(reader) == 0
+        reader.snapshot.close()
+    finally:
+        os.remove(db_path)
+        os.remove(index_path)
+        os.remove(unresolved_path)
+        os.remove(snapshot_path)
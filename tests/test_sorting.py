@@ -36,6 +36,13 @@ def test_rhymer_en():
     assert sum(1 for p in sorting.Rhymer(debug=True).generate_from_source(lines)) == 0
 
 
+def test_rhymer_chunked():
+    lines = ['i love you too', 'I know you do', 'i rhyme with nothing']
+    poems = list(sorting.Rhymer().generate_from_source(lines, chunk_size=2))
+    assert len(poems) == 1
+    assert [l.text for l in poems[0].lines] == lines[:2]
+
+
 def test_ignore_language():
     poet_fr = sorting.Poet(lang='fr')
     poet_en = sorting.Poet(lang='en')
@@ -52,3 +59,19 @@ def test_multi_poet_language_ignore():
         {'text': 'a line, for a poem.', 'lang': 'en'},
         key='text')) == 1
     assert len(multi.add_keyed_line('keyless line')) == 2
+
+
+def test_haiku_chunked():
+    lines = ['my day is coming', 'are you my one true good bud', 'or are you a bro']
+    haikuer = sorting.Haikuer()
+    poems = list(haikuer.generate_from_source(lines + lines, chunk_size=4))
+    assert len(poems) == 2
+    assert [l.syllable_count for l in poems[0].lines] == [5, 7, 5]
+
+
+def test_syllable_poet_engine():
+    lines = ['nation station', 'ocean']
+    poet = sorting.SyllablePoet([2, 4], syllable_engine='phonemes')
+    poems = list(poet.generate_from_source(lines, chunk_size=2))
+    assert len(poems) == 1
+    assert [l.syllable_count for l in poems[0].lines] == [2, 4]
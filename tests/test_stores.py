@@ -0,0 +1,123 @@
+# coding: utf-8
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import sqlite3
+import multiprocessing
+
+from poetryutils2 import stores, rhyme
+
+
+def _check_store(backend, path):
+    store = backend(path)
+    assert store.is_empty()
+    store[b'a'] = b'1'
+    assert b'a' in store
+    assert store[b'a'] == b'1'
+    store.close()
+
+    store = backend(path, session=True)
+    store[b'b'] = b'2'
+    # buffered writes are visible before they're synced
+    assert store[b'b'] == b'2'
+    store.sync()
+    assert sorted(store.keys()) == [b'a', b'b']
+    assert len(store) == 2
+    store.close()
+
+    store = backend(path, new=True)
+    assert store.is_empty()
+    store.close()
+
+
+def test_dbm_store():
+    try:
+        path = 'test_store_dbm.tmp'
+        _check_store(stores.DBMStore, path)
+    finally:
+        os.remove(path)
+
+
+def test_sqlite_store():
+    try:
+        path = 'test_store_sqlite.tmp'
+        _check_store(stores.SQLiteStore, path)
+        # a second connection sees committed writes
+        writer = stores.SQLiteStore(path, session=True)
+        reader = stores.SQLiteStore(path)
+        writer[b'c'] = b'3'
+        assert b'c' not in reader
+        writer.sync()
+        assert reader[b'c'] == b'3'
+        writer.close()
+        reader.close()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def test_sqlite_transaction():
+    try:
+        path = 'test_store_transaction.tmp'
+        first = stores.SQLiteStore(path)
+        second = stores.SQLiteStore(path, timeout=0)
+        with first.transaction():
+            first[b'a'] = b'1'
+            # other writers wait for the transaction to finish
+            try:
+                with second.transaction():
+                    pass
+                assert False, 'second writer should have been locked out'
+            except sqlite3.OperationalError:
+                pass
+            assert b'a' not in second
+        assert second[b'a'] == b'1'
+        first.close()
+        second.close()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def _store_rhymes(prefix):
+    rhymer = rhyme.PhonemeRhymer('.', 'en', 'test_shared.sqlite.tmp', backend='sqlite')
+    for i in range(25):
+        # distinct words, all rhyming, none of them homophones
+        phonemes = '%sə%sˈaɪ' % (prefix, 'bdfgklmnprstvwz'[i % 15] * (i // 15 + 1))
+        with rhymer._open_db():
+            rhymer._record_entries({'%s%d' % (prefix, i): rhymer._make_entry(phonemes)})
+
+
+def test_sqlite_shared_index():
+    rhymer = rhyme.PhonemeRhymer('.', 'en', 'test_shared.sqlite.tmp', backend='sqlite')
+    try:
+        pool = multiprocessing.Pool(5)
+        pool.map(_store_rhymes, 'bdfgk')
+        pool.close()
+        pool.join()
+        assert len(rhymer) == 125
+        # no process lost another's index updates
+        assert len(rhymer.rhymes_for_word('b0')) == 124
+    finally:
+        for path in (rhymer.dbpath, rhymer.indexpath, rhymer.unresolvedpath):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+
+def test_sqlite_rhymer():
+    try:
+        rhymer = rhyme.PhonemeRhymer('.', 'en', 'test_rhymer.sqlite.tmp', backend='sqlite')
+        with rhymer:
+            rhymer.prefetch(['hi', 'bye', 'sigh'])
+        assert len(rhymer) == 3
+        assert rhymer.get_phonemes('bye') == rhymer.get_entry('bye').phonemes
+        assert sorted(rhymer.rhymes_for_word('hi')) == ['bye', 'sigh']
+    finally:
+        for path in (rhymer.dbpath, rhymer.indexpath, rhymer.unresolvedpath):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
@@ -364,8 +364,70 @@ def test_syllables():
         assert result == t[1]
 
 
+def test_adjustment_matches_regexes():
+    from poetryutils2 import syllables
+    words = [syllables._normalize_word(t.split()[0]) for t in test_data.splitlines() if t.strip()]
+    words += ['coalesce', 'mcdonald', 'guava', 'quaint', 'real', 'bullion',
+              'cooed', 'queueing', 'asia', 'lately', 'dnt']
+    for word in words:
+        if word.isalpha():
+            assert syllables._adjustment(word) == syllables._regex_adjustment(word), word
+
+
+def test_syllable_cache():
+    from poetryutils2 import syllables
+    syllables.set_cache_size(2)
+    try:
+        assert syllables._count('wedding') == 2
+        assert syllables._count('wedding') == 2
+        syllables._count('sister')
+        syllables._count('forever')
+        stats = syllables.cache_stats()
+        assert stats['size'] == 2
+        assert stats['hits'] == 1
+        assert stats['evictions'] == 1
+        # special cases are never evicted, and never take up cache space
+        special = next(iter(syllables.special_cases))
+        hits = stats['special_hits']
+        syllables._count(special)
+        stats = syllables.cache_stats()
+        assert stats['special_hits'] == hits + 1
+        assert stats['size'] == 2
+    finally:
+        syllables.set_cache_size(syllables.SYLLABLE_CACHE_SIZE)
+
+
+def test_count_syllables_many():
+    lines = [t.strip().split()[0] for t in test_data.splitlines() if len(t)]
+    lines = [' '.join(lines[i:i + 5]) for i in range(0, len(lines), 3)] + [None, '']
+    counts = poetryutils2.count_syllables_many(lines)
+    assert list(counts) == [poetryutils2.count_syllables(l) for l in lines]
+
+
+def test_syllable_cutoff():
+    from poetryutils2 import syllables
+    syllables.fallback_cache.clear()
+    assert poetryutils2.count_syllables('wedding sister forever', cutoff=3) is None
+    # counting stops at the word that passes the cutoff
+    assert 'forever' not in syllables.fallback_cache
+    assert poetryutils2.count_syllables('wedding sister forever', cutoff=7) == 7
+
+
+def test_phoneme_engine():
+    lines = ['nation station', 'lol hi', 'ocean']
+    assert poetryutils2.count_syllables('nation station', engine='phonemes') == 4
+    # special cases still apply
+    assert poetryutils2.count_syllables('lol', engine='phonemes') == 3
+    assert list(poetryutils2.count_syllables_many(lines, engine='phonemes')) == [4, 4, 2]
+
+
 def main():
     test_syllables()
+    test_adjustment_matches_regexes()
+    test_syllable_cache()
+    test_count_syllables_many()
+    test_syllable_cutoff()
+    test_phoneme_engine()
 
 if __name__ == "__main__":
     main()
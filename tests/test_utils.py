@@ -25,3 +25,55 @@ def test_syllable_string_parsing():
     assert utils.parse_range_string('1-4') == (1, 2, 3, 4)
     assert utils.parse_range_string('4,5,10') == (4, 5, 10)
     assert utils.parse_range_string('4-5, 10') == (4, 5, 10)
+
+
+def test_lru_cache():
+    cache = utils.LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    # 'b' was least recently used
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['evictions'] == 1
+    assert len(cache) == 2
+
+
+def test_bounded_counter():
+    counter = utils.BoundedCounter(capacity=2)
+    counter.update('aaaaabbbbccd')
+    assert counter.total == 12
+    assert counter.most_common(2) == [('a', 5), ('b', 4)]
+    counter.update('efg')
+    # rare items were dropped to stay in bounds
+    assert len(counter) <= 4
+    assert counter.most_common(1) == [('a', 5)]
+    assert counter.error >= 1
+
+    # counts can be over, but never under, by at most error
+    items = 'aabcbdcbbeafbg'
+    counter = utils.BoundedCounter(capacity=1)
+    for i, item in enumerate(items):
+        counter.add(item)
+        seen = items[:i + 1]
+        for x in set(seen):
+            if x in counter:
+                assert seen.count(x) <= counter[x] <= seen.count(x) + counter.error
+            else:
+                assert seen.count(x) <= counter.error
+
+
+def test_tokenize():
+    from poetryutils2 import syllables
+    lines = ["it's a #PracticeDay", "me & you http://t.co/abc's", "don't'stop 4ever",
+             "#FooBar1x yes", "can't\tstop", "a'b'c", "(what?) -- ok...", "#Http://x.co", ""]
+    for line in lines:
+        expected = [w for w in syllables._format_input(line).split() if w.isalpha()]
+        assert utils.tokenize(line) == expected
+    assert utils.tokenize("isn't it #GoodNews") == ['isnt', 'it', 'good', 'news']
+    assert utils.split_words("c'est #BonneNuit, mes amis") == ["c'est", 'bonne', 'nuit', 'mes', 'amis']